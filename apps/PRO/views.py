@@ -11,7 +11,7 @@ from rest_framework import (
     generics,
     status,
 )
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from qms_api.authentication import CachedJWTAuthentication
 
 from qms_api.pagination import StandardResultsSetPagination
 from qms_api.custom_permissions import HasPermissionOrInGroupWithPermission
@@ -29,7 +29,7 @@ from apps.PRO.serializers import (
 class PROCreateView(generics.CreateAPIView):
     serializer_class = PROSerializer
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_codename = "PRO.add_pro"
 
     def perform_create(self, serializer):
@@ -55,7 +55,7 @@ class PROCreateView(generics.CreateAPIView):
 class PROListView(generics.ListAPIView):
     queryset = PRO.objects.filter(is_deleted=False).order_by("-created_at")
     serializer_class = PROSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "PRO.view_pro"
     pagination_class = StandardResultsSetPagination
@@ -67,7 +67,7 @@ class PROListView(generics.ListAPIView):
 class DeletedPROListView(generics.ListAPIView):
     queryset = PRO.objects.filter(is_deleted=True).order_by("-created_at")
     serializer_class = PROSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "PRO.view_pro"
     pagination_class = StandardResultsSetPagination
@@ -78,7 +78,7 @@ class DeletedPROListView(generics.ListAPIView):
 
 class PRORetrieveView(generics.RetrieveAPIView):
     serializer_class = PROSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "PRO.view_pro"
     lookup_field = "id"
@@ -94,7 +94,7 @@ class ActivePROListView(generics.ListAPIView):
         "-created_at"
     )
     serializer_class = PROSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "PRO.view_pro"
     pagination_class = StandardResultsSetPagination
@@ -105,7 +105,7 @@ class ActivePROListView(generics.ListAPIView):
 
 class PROChangeActiveView(generics.UpdateAPIView):
     serializer_class = PROActiveSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "PRO.change_pro"
 
@@ -136,7 +136,7 @@ class PROChangeActiveView(generics.UpdateAPIView):
 
 class PROUpdateView(generics.UpdateAPIView):
     serializer_class = PROSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "PRO.change_pro"
     lookup_field = "id"
@@ -163,7 +163,7 @@ class PROUpdateView(generics.UpdateAPIView):
 
 class PRODeleteTemporaryView(generics.UpdateAPIView):
     serializer_class = PRODeletedSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "PRO.change_pro"
 
@@ -208,7 +208,7 @@ class PRODeleteTemporaryView(generics.UpdateAPIView):
 class PRORestoreView(generics.RetrieveUpdateAPIView):
 
     serializer_class = PRODeletedSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "PRO.change_pro"
 
@@ -243,7 +243,7 @@ class PRORestoreView(generics.RetrieveUpdateAPIView):
 
 
 class PRODeleteView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "PRO.delete_pro"
 
@@ -269,5 +269,5 @@ class PRODeleteView(APIView):
 class PRODialogView(generics.ListAPIView):
     queryset = PRO.objects.filter(is_deleted=False, is_active=True)
     serializer_class = PRODialogSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
@@ -13,7 +13,7 @@ from rest_framework import (
     status,
 )
 
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from qms_api.authentication import CachedJWTAuthentication
 
 from apps.about_us.models import AboutUs
 from apps.about_us.serializers import AboutUsSerializer
@@ -22,7 +22,7 @@ from qms_api.custom_permissions import HasPermissionOrInGroupWithPermission
 
 class AboutUsCreateView(generics.CreateAPIView):
     serializer_class = AboutUsSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "about_us.add_aboutus"
 
@@ -72,7 +72,7 @@ class AboutUsRetrieveView(generics.RetrieveAPIView):
 
 class AboutUsUpdateView(generics.UpdateAPIView):
     serializer_class = AboutUsSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "about_us.change_aboutus"
 
@@ -99,7 +99,7 @@ class AboutUsUpdateView(generics.UpdateAPIView):
 
 
 class AboutUsDeleteView(generics.DestroyAPIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "about_us.delete_aboutus"
 
@@ -147,7 +147,7 @@ class DownloadFileView(APIView):
 
 class UploadFileView(APIView):
     parser_classes = [MultiPartParser]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def post(self, request, format=None):
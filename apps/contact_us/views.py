@@ -9,7 +9,7 @@ from rest_framework import (
     status,
 )
 
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from qms_api.authentication import CachedJWTAuthentication
 
 from apps.contact_us.models import ContactUs
 from .serializers import ContactUsSerializer, ContactUsReadSerializer
@@ -32,7 +32,7 @@ class ContactUSCreateView(generics.CreateAPIView):
 
 class ContactUsListView(generics.ListAPIView):
     serializer_class = ContactUsSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "contact_us.view_contactus"
 
@@ -42,7 +42,7 @@ class ContactUsListView(generics.ListAPIView):
 
 class ContactUsRetrieveView(generics.RetrieveAPIView):
     serializer_class = ContactUsSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "contact_us.view_contactus"
 
@@ -56,7 +56,7 @@ class ContactUsRetrieveView(generics.RetrieveAPIView):
 
 class ContactUsChangeRead(generics.UpdateAPIView):
     serializer_class = ContactUsReadSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "contact_us.change_contactus"
 
@@ -79,7 +79,7 @@ class ContactUsChangeRead(generics.UpdateAPIView):
 
 
 class ContactUsDeleteView(generics.DestroyAPIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "contact_us.delete_contactus"
 
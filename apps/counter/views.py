@@ -11,7 +11,7 @@ from rest_framework import (
     generics,
     status,
 )
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from qms_api.authentication import CachedJWTAuthentication
 
 from qms_api.pagination import StandardResultsSetPagination
 from qms_api.custom_permissions import HasPermissionOrInGroupWithPermission
@@ -29,7 +29,7 @@ from apps.counter.serializers import (
 
 class CounterCreateView(generics.CreateAPIView):
     serializer_class = CounterSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "counter.add_counter"
 
@@ -50,7 +50,7 @@ class CounterCreateView(generics.CreateAPIView):
 class CounterListView(generics.ListAPIView):
     queryset = Counter.objects.filter(is_deleted=False)
     serializer_class = CounterDisplaySerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "counter.view_counter"
 
@@ -63,7 +63,7 @@ class CounterListView(generics.ListAPIView):
 class DeletedCounterListView(generics.ListAPIView):
     queryset = Counter.objects.filter(is_deleted=True)
     serializer_class = CounterDisplaySerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "counter.view_counter"
 
@@ -75,7 +75,7 @@ class DeletedCounterListView(generics.ListAPIView):
 
 class CounterRetrieveView(generics.RetrieveAPIView):
     serializer_class = CounterDisplaySerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "counter.view_counter"
 
@@ -90,7 +90,7 @@ class CounterRetrieveView(generics.RetrieveAPIView):
 class ActiveCounterListView(generics.ListAPIView):
     queryset = Counter.objects.filter(is_deleted=False, is_active=True)
     serializer_class = CounterDisplaySerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "counter.view_counter"
 
@@ -102,7 +102,7 @@ class ActiveCounterListView(generics.ListAPIView):
 
 class CounterChangeActiveView(generics.UpdateAPIView):
     serializer_class = CounterActiveSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "counter.change_counter"
 
@@ -133,7 +133,7 @@ class CounterChangeActiveView(generics.UpdateAPIView):
 
 class CounterUpdateView(generics.UpdateAPIView):
     serializer_class = CounterSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "counter.change_counter"
 
@@ -161,7 +161,7 @@ class CounterUpdateView(generics.UpdateAPIView):
 
 class CounterDeleteTemporaryView(generics.UpdateAPIView):
     serializer_class = CounterDeleteSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "counter.change_counter"
 
@@ -207,7 +207,7 @@ class CounterDeleteTemporaryView(generics.UpdateAPIView):
 
 class CounterRestoreView(generics.UpdateAPIView):
     serializer_class = CounterDeleteSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "counter.change_counter"
 
@@ -250,7 +250,7 @@ class CounterRestoreView(generics.UpdateAPIView):
 
 
 class CounterDeleteView(generics.DestroyAPIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "counter.delete_counter"
 
@@ -267,7 +267,7 @@ class CounterDeleteView(generics.DestroyAPIView):
 
 
 class CounterDialogView(generics.ListAPIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "counter.view_counter"
 
@@ -276,7 +276,7 @@ class CounterDialogView(generics.ListAPIView):
 
 
 class CounterTypeDialogView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "counter.view_counter"
 
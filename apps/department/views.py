@@ -9,7 +9,7 @@ from rest_framework.filters import SearchFilter, OrderingFilter
 from django_filters.rest_framework import DjangoFilterBackend
 
 
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from qms_api.authentication import CachedJWTAuthentication
 
 from apps.department.models import Department
 from apps.department.serializers import (
@@ -26,7 +26,7 @@ from qms_api.custom_permissions import HasPermissionOrInGroupWithPermission
 
 class DepartmentCreateView(generics.CreateAPIView):
     serializer_class = DepartmentSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "department.add_department"
 
@@ -52,7 +52,7 @@ class DepartmentCreateView(generics.CreateAPIView):
 class DepartmentListView(generics.ListAPIView):
     queryset = Department.objects.filter(is_deleted=False)
     serializer_class = DepartmentSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "department.view_department"
     pagination_class = StandardResultsSetPagination
@@ -65,7 +65,7 @@ class DepartmentListView(generics.ListAPIView):
 class DeletedDepartmentListView(generics.ListAPIView):
     queryset = Department.objects.filter(is_deleted=True)
     serializer_class = DepartmentSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "department.view_department"
     pagination_class = StandardResultsSetPagination
@@ -77,7 +77,7 @@ class DeletedDepartmentListView(generics.ListAPIView):
 
 class DepartmentRetrieveView(generics.RetrieveAPIView):
     serializer_class = DepartmentSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "department.view_department"
     lookup_field = "id"
@@ -90,7 +90,7 @@ class DepartmentRetrieveView(generics.RetrieveAPIView):
 
 class DepartmentChangeActiveView(generics.UpdateAPIView):
     serializer_class = DepartmentActiveSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "department.change_department"
 
@@ -121,7 +121,7 @@ class DepartmentChangeActiveView(generics.UpdateAPIView):
 
 class DepartmentUpdateView(generics.UpdateAPIView):
     serializer_class = DepartmentSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "department.change_department"
     lookup_field = "id"
@@ -148,7 +148,7 @@ class DepartmentUpdateView(generics.UpdateAPIView):
 
 class DepartmentDeleteTemporaryView(generics.UpdateAPIView):
     serializer_class = DepartmentDeleteSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "department.change_department"
 
@@ -195,7 +195,7 @@ class DepartmentDeleteTemporaryView(generics.UpdateAPIView):
 class DepartmentRestoreView(generics.RetrieveUpdateAPIView):
 
     serializer_class = DepartmentDeleteSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "department.change_department"
 
@@ -234,7 +234,7 @@ class DepartmentRestoreView(generics.RetrieveUpdateAPIView):
 
 
 class DepartmentDeleteView(generics.DestroyAPIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "department.delete_department"
 
@@ -251,6 +251,6 @@ class DepartmentDeleteView(generics.DestroyAPIView):
 class DepartmentDialogView(generics.ListAPIView):
     queryset=Department.objects.filter(is_deleted=False)
     serializer_class=DepartmentDialogSerializer
-    authentication_classes=[JWTAuthentication]
+    authentication_classes=[CachedJWTAuthentication]
     permission_classes=[IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "department.view_department"
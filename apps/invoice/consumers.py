@@ -38,4 +38,16 @@ class InvoiceNotificationConsumer(AsyncWebsocketConsumer):
         except KeyError as e:
             print(f"KeyError in invoice_created: {e}")  # Debugging
         except Exception as e:
-            print(f"Error in invoice_created: {e}")  # Debugging
\ No newline at end of file
+            print(f"Error in invoice_created: {e}")  # Debugging
+
+    async def invoice_pdf_ready(self, event):
+        message = event["message"]
+        await self.send(
+            text_data=json.dumps(
+                {
+                    "type": "invoice_pdf_ready",
+                    "id": message["id"],
+                    "invoice_pdf": message["invoice_pdf"],
+                }
+            )
+        )
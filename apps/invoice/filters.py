@@ -8,6 +8,12 @@ class InvoiceFilter(django_filters.FilterSet):
     created_at = django_filters.CharFilter(
         field_name="created_at", lookup_expr="icontains"
     )
+    created_from = django_filters.DateFilter(
+        field_name="created_at", lookup_expr="date__gte"
+    )
+    created_to = django_filters.DateFilter(
+        field_name="created_at", lookup_expr="date__lte"
+    )
     contact_name = django_filters.CharFilter(
         field_name="contact_name", lookup_expr="icontains"
     )
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.invoice.models import Invoice
+from qms_api.util import generate_invoice_pdf
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure how long generate_invoice_pdf takes per invoice for an existing "
+        "invoice (the newest one by default), to catch regressions of the PDF "
+        "renderer."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("invoice_id", nargs="?", help="Invoice to render.")
+        parser.add_argument("--renders", type=int, default=30)
+
+    def handle(self, *args, **options):
+        invoices = Invoice.objects.all()
+        if options["invoice_id"]:
+            invoices = invoices.filter(id=options["invoice_id"])
+        invoice = invoices.order_by("-created_at").first()
+        if invoice is None:
+            raise CommandError("No invoice to render.")
+
+        # The first render registers the fonts and builds the shared styles
+        started = time.perf_counter()
+        generate_invoice_pdf(invoice)
+        first = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for _ in range(options["renders"]):
+            generate_invoice_pdf(invoice)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"Invoice {invoice.id} ({invoice.line_items.count()} line items): "
+            f"first render {first * 1000:.1f} ms, then "
+            f"{elapsed / options['renders'] * 1000:.1f} ms per invoice over "
+            f"{options['renders']} renders"
+        )
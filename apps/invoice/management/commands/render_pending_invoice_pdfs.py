@@ -0,0 +1,46 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.invoice.pdf import render_stale_invoice_pdfs
+
+
+class Command(BaseCommand):
+    help = (
+        "Render invoice PDFs that are still pending long after they were queued, "
+        "e.g. because the web process rendering them restarted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument(
+            "--stale-after",
+            type=float,
+            default=getattr(settings, "INVOICE_PDF_STALE_AFTER", 300),
+            help="Seconds a PDF may stay pending before it is rendered here.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=60,
+            help="Seconds to wait when there is nothing to render.",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Render one batch and exit."
+        )
+
+    def handle(self, *args, **options):
+        def render_batch():
+            return render_stale_invoice_pdfs(
+                options["stale_after"], batch_size=options["batch_size"]
+            )
+
+        if options["once"]:
+            count = render_batch()
+            self.stdout.write(f"Rendered {count} pending invoice PDFs.")
+            return
+        self.stdout.write("Rendering pending invoice PDFs...")
+        while True:
+            if not render_batch():
+                time.sleep(options["interval"])
@@ -1,29 +1,89 @@
-from django.db import models
+from django.db import models, connection, transaction
 from django.db.models import Sum, F
 from django.conf import settings
 from django.core.validators import RegexValidator
 from django.utils.translation import gettext_lazy as _
 from django.dispatch import receiver
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_delete
 
 
 from apps.service.models import Service
 from apps.PRO.models import PRO
 
 import os
+import re
 from decimal import Decimal
 
 
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
+from apps.outbox.models import OutboxEvent
 from qms_api.util import invoice_pdf_file_path, generate_invoice_pdf
 
 
+class InvoiceSequence(models.Model):
+    """
+    Counter used to hand out invoice IDs, one row per ID prefix (e.g. one per
+    branch).
+    """
+
+    prefix = models.CharField(max_length=10, unique=True)
+    last_number = models.PositiveBigIntegerField(default=0)
+
+    @classmethod
+    def next_id(cls, prefix="INV"):
+        """
+        Allocate the next invoice ID for ``prefix``, e.g. ``INV000000042``.
+
+        The increment holds the row lock until the surrounding transaction
+        ends, so parallel creates never get the same ID, and a rolled back
+        invoice gives its number back instead of leaving a gap. Must be
+        called inside the transaction that inserts the invoice.
+        """
+        table = connection.ops.quote_name(cls._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {table} SET last_number = last_number + 1
+                WHERE prefix = %s
+                RETURNING last_number
+                """,
+                [prefix],
+            )
+            row = cursor.fetchone()
+            if row is None:
+                # First ID of this prefix: continue after the invoices that
+                # exist already. Only IDs of exactly this shape count, not
+                # those of longer prefixes that start the same way
+                id_pattern = rf"^{re.escape(prefix)}[0-9]{{9}}$"
+                last_invoice = (
+                    Invoice.objects.filter(id__regex=id_pattern)
+                    .order_by("-id")
+                    .values_list("id", flat=True)
+                    .first()
+                )
+                last_number = int(last_invoice[len(prefix):]) if last_invoice else 0
+                cursor.execute(
+                    f"""
+                    INSERT INTO {table} (prefix, last_number) VALUES (%s, %s)
+                    ON CONFLICT (prefix)
+                    DO UPDATE SET last_number = {table}.last_number + 1
+                    RETURNING last_number
+                    """,
+                    [prefix, last_number + 1],
+                )
+                row = cursor.fetchone()
+        return f"{prefix}{row[0]:09d}"
+
+
 class Invoice(models.Model):
     GROUP_CHOICES = [
         ("PRO", "PRO"),
         ("Normal", "Normal"),
     ]
+    PDF_STATUS_CHOICES = [
+        ("pending", _("Pending")),
+        ("ready", _("Ready")),
+        ("failed", _("Failed")),
+    ]
     phone_num_regex = RegexValidator(
         regex="^[0-9]{9,20}$",
         message=_("Entered phone number isn't in a right format!"),
@@ -73,6 +133,17 @@ class Invoice(models.Model):
     invoice_pdf = models.FileField(
         upload_to=invoice_pdf_file_path, blank=True, null=True
     )
+    # "ready" by default so that existing invoices, rendered before renders
+    # were queued, are not taken for pending ones; queue_invoice_pdf marks
+    # each render it queues as "pending"
+    pdf_status = models.CharField(
+        max_length=10, choices=PDF_STATUS_CHOICES, default="ready"
+    )
+    # Hash of the rendered inputs (header, line items, totals) of invoice_pdf
+    pdf_hash = models.CharField(max_length=64, blank=True, default="")
+    # When the pending render was queued; renders that never finished are
+    # picked up again by render_pending_invoice_pdfs
+    pdf_requested_at = models.DateTimeField(blank=True, null=True)
 
     # creation info
     created_at = models.DateTimeField(auto_now_add=True)
@@ -92,73 +163,125 @@ class Invoice(models.Model):
         null=True,
     )
 
-    def save(self, *args, **kwargs):
-        if not self.id:
-            # Fetch the last invoice
-            last_invoice = Invoice.objects.order_by("-created_at").first()
-            if last_invoice and last_invoice.id.startswith("INV"):
-                last_number = int(last_invoice.id[3:])  # Extract the numeric part
-                new_number = last_number + 1
-            else:
-                new_number = 1
-            self.id = f"INV{new_number:09d}"  # Format as INV followed by 9-digit number
+    class Meta:
+        indexes = [
+            # Newest-first listing and its keyset pages
+            models.Index(fields=["-created_at", "-id"], name="invoice_created_at_idx"),
+            # Renders still pending, for the stale render sweep
+            models.Index(
+                fields=["pdf_requested_at"],
+                condition=models.Q(pdf_status="pending"),
+                name="invoice_pdf_pending_idx",
+            ),
+        ]
 
-        # Calculate totals based on line items
-        self.total_gov_fee = sum(
-            Decimal(item.gov_total) for item in self.line_items.all()
-        )
-        self.total_service_fee = sum(
-            Decimal(item.quantity) * Decimal(item.service.service_fee)
-            for item in self.line_items.all()
-        )
-        self.total_typing_fee = sum(
-            Decimal(item.quantity) * Decimal(item.service.typing_fee)
-            for item in self.line_items.all()
-        )
-        self.total_additional_fee = sum(
-            Decimal(item.quantity) * Decimal(item.service.add_fee)
-            for item in self.line_items.all()
-        )
-        self.vat = sum(
-            Decimal(item.quantity) * Decimal(item.service.vat)
-            for item in self.line_items.all()
-        )
-        self.total_fins = sum(Decimal(item.fins) for item in self.line_items.all())
-
-        self.grand_total = (
-            self.total_gov_fee
-            + self.total_service_fee
-            + self.total_typing_fee
-            + self.total_additional_fee
-            + self.vat
-            + self.total_fins
+    def calculate_totals(self, line_items=None):
+        """
+        Set every total from the line items in a single pass. Pass the line
+        items when they are at hand already, otherwise they are loaded with
+        their services in one query.
+        """
+        if line_items is None:
+            line_items = self.line_items.select_related("service")
+
+        totals = dict.fromkeys(
+            ["gov", "service", "typing", "additional", "vat", "fins"], Decimal(0)
         )
+        for item in line_items:
+            quantity = Decimal(item.quantity)
+            service = item.service
+            totals["gov"] += Decimal(item.gov_total)
+            totals["service"] += quantity * Decimal(service.service_fee)
+            totals["typing"] += quantity * Decimal(service.typing_fee)
+            totals["additional"] += quantity * Decimal(service.add_fee)
+            totals["vat"] += quantity * Decimal(service.vat)
+            totals["fins"] += Decimal(item.fins)
 
-        # Reset commissions if the invoice is cancelled
-        if self.is_cancelled:
-            self.pro_commission = Decimal(0)
-            self.employee_commission = Decimal(0)
-            self.system_commission = Decimal(0)
-        else:
-            # Calculate commissions only if the invoice is not cancelled
-            if self.group == "PRO" and self.pro:
-                self.pro_commission = (
-                    Decimal(self.pro.commission_percentage)
-                    / Decimal(100)
-                    * self.total_typing_fee
-                )
-                self.employee_commission = Decimal(0.25) * self.total_typing_fee
-                self.system_commission = self.total_typing_fee - (
-                    self.pro_commission + self.employee_commission
+        self.total_gov_fee = totals["gov"]
+        self.total_service_fee = totals["service"]
+        self.total_typing_fee = totals["typing"]
+        self.total_additional_fee = totals["additional"]
+        self.vat = totals["vat"]
+        self.total_fins = totals["fins"]
+        self.grand_total = sum(totals.values())
+
+    def save(self, *args, update_totals=True, **kwargs):
+        """
+        ``update_totals=False`` keeps the totals as they are, for callers that
+        already ran ``calculate_totals`` with the line items in hand.
+        """
+        # The ID allocation and the insert commit or roll back together
+        with transaction.atomic():
+            if not self.id:
+                # Format as INV followed by 9-digit number
+                self.id = InvoiceSequence.next_id(
+                    getattr(settings, "INVOICE_ID_PREFIX", "INV")
                 )
-            elif self.group == "Normal" and not self.pro:
+                kwargs["force_insert"] = True
+
+            # Totals follow the line items stored so far; a new invoice has none
+            if update_totals:
+                self.calculate_totals([] if self._state.adding else None)
+
+            # Reset commissions if the invoice is cancelled
+            if self.is_cancelled:
                 self.pro_commission = Decimal(0)
-                self.employee_commission = Decimal(0.5) * self.total_typing_fee
-                self.system_commission = self.total_typing_fee - (
-                    self.pro_commission + self.employee_commission
-                )
+                self.employee_commission = Decimal(0)
+                self.system_commission = Decimal(0)
+            else:
+                # Calculate commissions only if the invoice is not cancelled
+                if self.group == "PRO" and self.pro:
+                    self.pro_commission = (
+                        Decimal(self.pro.commission_percentage)
+                        / Decimal(100)
+                        * self.total_typing_fee
+                    )
+                    self.employee_commission = Decimal(0.25) * self.total_typing_fee
+                    self.system_commission = self.total_typing_fee - (
+                        self.pro_commission + self.employee_commission
+                    )
+                elif self.group == "Normal" and not self.pro:
+                    self.pro_commission = Decimal(0)
+                    self.employee_commission = Decimal(0.5) * self.total_typing_fee
+                    self.system_commission = self.total_typing_fee - (
+                        self.pro_commission + self.employee_commission
+                    )
+
+            super().save(*args, **kwargs)
 
-        super().save(*args, **kwargs)
+    def notify_created(self, line_items=None):
+        """
+        Queue the ``invoice_created`` notification, once per invoice write;
+        call inside the transaction that writes the invoice.
+        """
+        if line_items is None:
+            line_items = self.line_items.select_related("service")
+
+        OutboxEvent.publish(
+            "invoice_notifications",  # Group name
+            {
+                "type": "invoice_created",
+                "message": {
+                    "id": self.id,
+                    "token_no": self.token_no,
+                    "contact_name": self.contact_name,
+                    "contact_no": self.contact_no,
+                    "is_paid": self.is_paid,
+                    "is_cancelled": self.is_cancelled,
+                    "created_at": self.created_at.isoformat(),
+                    # Include line items
+                    "line_items": [
+                        {
+                            "service_name": item.service.name,
+                            "quantity": item.quantity,
+                            "gov_total": str(item.gov_total),
+                            "fins": str(item.fins),
+                        }
+                        for item in line_items
+                    ],
+                },
+            },
+        )
 
 
 class InvoiceLineItem(models.Model):
@@ -175,46 +298,21 @@ class InvoiceLineItem(models.Model):
     ref_no2 = models.CharField(max_length=255, blank=True, null=True)
     ref_no3 = models.CharField(max_length=255, blank=True, null=True)
 
-    def save(self, *args, **kwargs):
+    def calculate_gov_total(self):
         self.gov_total = Decimal(self.service.gov_fee) * self.quantity
-        super().save(*args, **kwargs)
-        # Trigger invoice save to update totals
-        if self.invoice:
-            self.invoice.save()
-
-
-@receiver(post_save, sender=InvoiceLineItem)
-def send_invoice_notification(sender, instance, created, **kwargs):
-    if created:
-        invoice = instance.invoice
-        # Serialize line items
-        line_items = [
-            {
-                "service_name": item.service.name,
-                "quantity": item.quantity,
-                "gov_total": str(item.gov_total),
-                "fins": str(item.fins),
-            }
-            for item in invoice.line_items.all()
-        ]
 
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            "invoice_notifications",  # Group name
-            {
-                "type": "invoice_created",
-                "message": {
-                    "id": invoice.id,
-                    "token_no": invoice.token_no,
-                    "contact_name": invoice.contact_name,
-                    "contact_no": invoice.contact_no,
-                    "is_paid": invoice.is_paid,
-                    "is_cancelled": invoice.is_cancelled,
-                    "created_at": invoice.created_at.isoformat(),
-                    "line_items": line_items,  # Include line items
-                },
-            },
-        )
+    def save(self, *args, update_invoice=True, **kwargs):
+        """
+        ``update_invoice=False`` leaves the invoice totals alone, for callers
+        that write several line items and update the invoice once afterwards.
+        """
+        self.calculate_gov_total()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # Trigger invoice save to update totals
+            if self.invoice and update_invoice:
+                self.invoice.save()
+
 
 @receiver(post_delete, sender=Invoice)
 def delete_invoice_pdf(sender, instance, **kwargs):
@@ -0,0 +1,298 @@
+import logging
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+
+import django
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.utils import timezone
+
+from apps.invoice.models import Invoice, InvoiceLineItem
+from apps.outbox.models import OutboxEvent
+from qms_api.util import aiterate_chunks, invoice_document, render_invoice_document
+
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor():
+    """
+    Process pool rendering invoice PDFs; reportlab is CPU bound, so renders
+    run in their own processes instead of the request threads.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=getattr(settings, "INVOICE_PDF_WORKERS", 2),
+            # Fresh interpreters rather than forks of a threaded server
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,
+        )
+    return _executor
+
+
+def pdf_file_exists(invoice):
+    return bool(invoice.invoice_pdf) and os.path.exists(
+        os.path.join(settings.MEDIA_ROOT, invoice.invoice_pdf.name)
+    )
+
+
+def queue_invoice_pdf(invoice):
+    """
+    Render the invoice PDF in the background once the current transaction has
+    committed, unless nothing shown on the printout changed.
+    """
+    # Read the data now, the worker process does not touch the database
+    document = invoice_document(invoice)
+    if document["hash"] == invoice.pdf_hash and invoice.pdf_status != "failed":
+        return
+
+    requested_at = timezone.now()
+    Invoice.objects.filter(id=invoice.id).update(
+        pdf_status="pending", pdf_hash=document["hash"], pdf_requested_at=requested_at
+    )
+    invoice.pdf_status = "pending"
+    invoice.pdf_hash = document["hash"]
+    invoice.pdf_requested_at = requested_at
+
+    def submit():
+        try:
+            future = get_executor().submit(render_invoice_document, document)
+        except Exception:
+            # The invoice stays pending and render_pending_invoice_pdfs
+            # renders it later
+            logger.exception("Queueing the PDF of invoice %s failed", invoice.id)
+            return
+        future.add_done_callback(
+            lambda future: _finish(invoice.id, document["hash"], future)
+        )
+
+    transaction.on_commit(submit)
+
+
+def render_invoice_pdf_now(invoice):
+    """Render the invoice PDF in this process, e.g. when its file is missing."""
+    document = invoice_document(invoice)
+    pdf_path = render_invoice_document(document)
+    _store(invoice.id, document["hash"], pdf_path, expected_hash=invoice.pdf_hash)
+    # Pending again if a newer render was queued meanwhile
+    invoice.refresh_from_db(fields=["invoice_pdf", "pdf_status", "pdf_hash"])
+    return invoice
+
+
+def _store(invoice_id, pdf_hash, pdf_path, expected_hash=None):
+    """
+    Mark ``pdf_path``, rendered with ``pdf_hash``, as the invoice's PDF,
+    unless the invoice's ``pdf_hash`` moved on from ``expected_hash`` (by
+    default ``pdf_hash``, the hash the render was queued with) meanwhile.
+    Return whether it was stored.
+    """
+    if expected_hash is None:
+        expected_hash = pdf_hash
+    with transaction.atomic():
+        invoice = (
+            Invoice.objects.select_for_update()
+            .only("id", "invoice_pdf", "pdf_hash")
+            .filter(id=invoice_id)
+            .first()
+        )
+        if invoice is None:
+            return False
+        if invoice.pdf_hash not in ("", expected_hash):
+            # The invoice changed again while this render ran; the newer
+            # render stores its own file
+            if invoice.invoice_pdf.name != pdf_path:
+                _remove_file(pdf_path)
+            return False
+
+        old_pdf_path = invoice.invoice_pdf.name
+        # update() instead of save(): the totals must not be recalculated
+        Invoice.objects.filter(id=invoice_id).update(
+            invoice_pdf=pdf_path, pdf_status="ready", pdf_hash=pdf_hash
+        )
+        if old_pdf_path and old_pdf_path != pdf_path:
+            transaction.on_commit(lambda: _remove_file(old_pdf_path))
+        OutboxEvent.publish(
+            "invoice_notifications",
+            {
+                "type": "invoice_pdf_ready",
+                "message": {"id": invoice_id, "invoice_pdf": pdf_path},
+            },
+        )
+    return True
+
+
+def _remove_file(pdf_path):
+    file_path = os.path.join(settings.MEDIA_ROOT, pdf_path)
+    if os.path.exists(file_path):
+        os.remove(file_path)
+
+
+def _finish(invoice_id, pdf_hash, future):
+    # Runs on the pool's result thread, which has its own DB connection
+    close_old_connections()
+    try:
+        try:
+            pdf_path = future.result()
+        except Exception:
+            logger.exception("Rendering the PDF of invoice %s failed", invoice_id)
+            Invoice.objects.filter(id=invoice_id, pdf_hash=pdf_hash).update(
+                pdf_status="failed"
+            )
+            return
+        _store(invoice_id, pdf_hash, pdf_path)
+    finally:
+        close_old_connections()
+
+
+def render_stale_invoice_pdfs(stale_after, batch_size=50):
+    """
+    Render the PDFs still pending ``stale_after`` seconds after they were
+    queued, e.g. because the process that queued them stopped before the
+    render finished, and return how many were rendered.
+
+    Each invoice is claimed by moving its ``pdf_requested_at`` forward, so
+    sweeps running side by side never render the same invoice.
+    """
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    invoices = Invoice.objects.filter(
+        pdf_status="pending", pdf_requested_at__lt=cutoff
+    ).order_by("pdf_requested_at")[:batch_size]
+
+    futures = {}
+    for invoice in invoices:
+        document = invoice_document(invoice)
+        claimed = Invoice.objects.filter(
+            id=invoice.id,
+            pdf_status="pending",
+            pdf_requested_at=invoice.pdf_requested_at,
+        ).update(pdf_hash=document["hash"], pdf_requested_at=timezone.now())
+        if claimed:
+            future = get_executor().submit(render_invoice_document, document)
+            futures[future] = (invoice.id, document["hash"])
+
+    for future in as_completed(futures):
+        _finish(*futures[future], future)
+    return len(futures)
+
+
+def ensure_invoice_pdfs(invoices):
+    """
+    Render the PDFs of ``invoices`` that are not on disk, in parallel, and
+    return ``{invoice_id: reason}`` for those left without a current PDF.
+
+    Pending invoices are skipped: their render is queued already, and
+    rendering them here as well could store a stale PDF over it.
+    """
+    unavailable = {}
+    missing = []
+    for invoice in invoices:
+        if invoice.pdf_status == "pending":
+            unavailable[invoice.id] = "The PDF is still being generated."
+        elif invoice.pdf_status != "ready" or not pdf_file_exists(invoice):
+            missing.append(invoice)
+    # One line item query for the whole batch
+    prefetch_related_objects(
+        missing,
+        Prefetch(
+            "line_items",
+            queryset=InvoiceLineItem.objects.select_related("service__department"),
+        ),
+    )
+    futures = {}
+    for invoice in missing:
+        document = invoice_document(invoice)
+        future = get_executor().submit(render_invoice_document, document)
+        futures[future] = (invoice, document["hash"])
+
+    for future in as_completed(futures):
+        invoice, pdf_hash = futures[future]
+        try:
+            pdf_path = future.result()
+        except Exception:
+            logger.exception("Rendering the PDF of invoice %s failed", invoice.id)
+            unavailable[invoice.id] = "The PDF could not be generated."
+            continue
+        if not _store(invoice.id, pdf_hash, pdf_path, expected_hash=invoice.pdf_hash):
+            unavailable[invoice.id] = "The invoice changed during the export."
+            continue
+        invoice.invoice_pdf = pdf_path
+        invoice.pdf_status = "ready"
+        invoice.pdf_hash = pdf_hash
+    return unavailable
+
+
+class _StreamBuffer:
+    """Write-only file object that keeps what ZipFile writes until drained."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _open_pdf(invoice):
+    if not pdf_file_exists(invoice):
+        return None
+    return open(os.path.join(settings.MEDIA_ROOT, invoice.invoice_pdf.name), "rb")
+
+
+async def stream_invoice_pdfs_zip(queryset, batch_size=50, chunk_size=64 * 1024):
+    """
+    Yield a ZIP archive of the PDFs of ``queryset`` piece by piece.
+
+    Invoices are read and their missing PDFs rendered a batch at a time, and
+    files are copied in chunks, so memory use does not grow with the export.
+    Database access, renders and file reads run in worker threads, keeping
+    the event loop free under ASGI. PDFs are already compressed and are
+    stored as they are. Invoices without a current PDF are listed in a
+    ``missing.txt`` entry at the end.
+    """
+    buffer = _StreamBuffer()
+    unavailable = {}
+    with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_STORED) as archive:
+        async for batch in aiterate_chunks(queryset, chunk_size=batch_size):
+            unavailable.update(await sync_to_async(ensure_invoice_pdfs)(batch))
+            for invoice in batch:
+                if invoice.id in unavailable:
+                    continue
+                source = await sync_to_async(_open_pdf)(invoice)
+                if source is None:
+                    unavailable[invoice.id] = "The PDF file is missing."
+                    continue
+                try:
+                    with archive.open(f"{invoice.id}.pdf", mode="w") as target:
+                        while chunk := await sync_to_async(source.read)(chunk_size):
+                            target.write(chunk)
+                            yield buffer.drain()
+                finally:
+                    await sync_to_async(source.close)()
+                yield buffer.drain()
+        if unavailable:
+            # Tell the reader which invoices are not in the archive and why
+            archive.writestr(
+                "missing.txt",
+                "".join(
+                    f"{invoice_id}: {reason}\n"
+                    for invoice_id, reason in unavailable.items()
+                ),
+            )
+    # Central directory, written when the archive is closed
+    yield buffer.drain()
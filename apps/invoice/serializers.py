@@ -1,16 +1,46 @@
+import uuid
+
 from django.utils.translation import gettext_lazy as _
-from django.conf import settings
+from django.db import transaction
 
 from rest_framework import serializers
 
 from apps.invoice.models import Invoice, InvoiceLineItem
+from apps.service.models import Service
+
+from apps.invoice.pdf import queue_invoice_pdf
+from apps.report.models import RevenueRollup
+
+
+class ServicePrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Resolves services from ``prefetched`` first, then from the database."""
 
-from qms_api.util import generate_invoice_pdf
-import os
+    prefetched = None
 
+    def to_internal_value(self, data):
+        if self.prefetched and str(data) in self.prefetched:
+            return self.prefetched[str(data)]
+        return super().to_internal_value(data)
+
+
+class InvoiceLineItemListSerializer(serializers.ListSerializer):
+    def to_internal_value(self, data):
+        """Load the services of all line items in one query."""
+        service_ids = set()
+        for item in data if isinstance(data, list) else []:
+            try:
+                service_ids.add(uuid.UUID(str(item.get("service"))))
+            except (AttributeError, ValueError):
+                continue
+        self.child.fields["service"].prefetched = {
+            str(service.pk): service
+            for service in Service.objects.filter(pk__in=service_ids)
+        }
+        return super().to_internal_value(data)
 
 
 class InvoiceLineItemSerializer(serializers.ModelSerializer):
+    service = ServicePrimaryKeyRelatedField(queryset=Service.objects.all())
     # service details
     service_name = serializers.CharField(source="service.name", read_only=True)
 
@@ -30,6 +60,7 @@ class InvoiceLineItemSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = InvoiceLineItem
+        list_serializer_class = InvoiceLineItemListSerializer
         fields = [
             "id",
             "service",
@@ -115,6 +146,7 @@ class InvoiceSerializer(serializers.ModelSerializer):
             "employee_commission",
             "system_commission",
             "invoice_pdf",
+            "pdf_status",
             "created_at",
             "created_by",
             "created_by_user_name",
@@ -126,6 +158,7 @@ class InvoiceSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = [
             "id",
+            "pdf_status",
             "is_cancelled",
             "is_paid",
             "created_at",
@@ -151,16 +184,29 @@ class InvoiceSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         """Handle creation of Invoice with nested line items."""
         line_items_data = validated_data.pop("line_items", [])
-        invoice = Invoice.objects.create(**validated_data)
 
-        # Create and associate line items with the invoice
-        for item_data in line_items_data:
-            InvoiceLineItem.objects.create(invoice=invoice, **item_data)
+        with transaction.atomic():
+            invoice = Invoice(**validated_data)
+            line_items = [InvoiceLineItem(**item_data) for item_data in line_items_data]
+            for line_item in line_items:
+                line_item.calculate_gov_total()
+
+            # Totals come from the line items in memory, the invoice is
+            # written once with them
+            invoice.calculate_totals(line_items)
+            invoice.save(update_totals=False)
+
+            # Create and associate line items with the invoice
+            for line_item in line_items:
+                line_item.invoice = invoice
+            InvoiceLineItem.objects.bulk_create(line_items)
+            RevenueRollup.apply_invoice(invoice, line_items)
 
-        # Generate the PDF and save it to the media directory
-        pdf_path = generate_invoice_pdf(invoice)
-        invoice.invoice_pdf = pdf_path
-        invoice.save(update_fields=["invoice_pdf"])
+            if line_items:
+                invoice.notify_created(line_items)
+
+            # Render the PDF in the background
+            queue_invoice_pdf(invoice)
 
         return invoice
 
@@ -168,48 +214,55 @@ class InvoiceSerializer(serializers.ModelSerializer):
         """Handle update of Invoice and nested line items."""
         line_items_data = validated_data.pop("line_items", [])  # Extract line items data
 
-        # Delete the old PDF file if it exists
-        if instance.invoice_pdf:
-            old_pdf_path = os.path.join(settings.MEDIA_ROOT, instance.invoice_pdf.name)
-            if os.path.exists(old_pdf_path):
-                os.remove(old_pdf_path)
-
-        # Update invoice fields
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
-
-        # Keep track of existing line items to delete those not in the update
-        existing_line_items = instance.line_items.all()
-        existing_line_items_ids = set(item.id for item in existing_line_items)
-        updated_line_items_ids = set()
-
-        # Update or create line items
-        for item_data in line_items_data:
-            line_item_id = item_data.get("id")
-            if line_item_id:
-                # Update existing line item
-                line_item = InvoiceLineItem.objects.get(id=line_item_id, invoice=instance)
-                for attr, value in item_data.items():
-                    setattr(line_item, attr, value)
-                line_item.save()
-                updated_line_items_ids.add(line_item_id)
-            else:
-                # Create new line item
-                InvoiceLineItem.objects.create(invoice=instance, **item_data)
-
-        # Delete line items that were not included in the update
-        for item in existing_line_items:
-            if item.id not in updated_line_items_ids:
-                item.delete()
-
-        # Recalculate totals after updating line items
-        instance.save()  # Trigger the save method in the Invoice model
-
-        # Generate a new PDF with the updated data
-        pdf_path = generate_invoice_pdf(instance)
-        instance.invoice_pdf = pdf_path
-        instance.save(update_fields=["invoice_pdf"])
+        with transaction.atomic():
+            # Update invoice fields
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+
+            # Keep track of existing line items to delete those not in the update
+            existing_line_items_ids = set(
+                instance.line_items.values_list("id", flat=True)
+            )
+            updated_line_items = []
+            new_line_items = []
+
+            # Update or create line items
+            for item_data in line_items_data:
+                line_item_id = item_data.get("id")
+                if line_item_id:
+                    # Update existing line item
+                    line_item = InvoiceLineItem.objects.select_related("service").get(
+                        id=line_item_id, invoice=instance
+                    )
+                    for attr, value in item_data.items():
+                        setattr(line_item, attr, value)
+                    line_item.save(update_invoice=False)
+                    updated_line_items.append(line_item)
+                else:
+                    # Create new line item
+                    line_item = InvoiceLineItem(invoice=instance, **item_data)
+                    line_item.calculate_gov_total()
+                    new_line_items.append(line_item)
+            InvoiceLineItem.objects.bulk_create(new_line_items)
+
+            # Delete line items that were not included in the update
+            InvoiceLineItem.objects.filter(
+                id__in=existing_line_items_ids
+                - {line_item.id for line_item in updated_line_items}
+            ).delete()
+
+            # Recalculate totals once, from the line items in memory
+            line_items = updated_line_items + new_line_items
+            instance.calculate_totals(line_items)
+            instance.save(update_totals=False)
+            RevenueRollup.apply_invoice(instance, line_items)
+
+            if new_line_items:
+                instance.notify_created()
+
+            # Render a new PDF with the updated data in the background; it
+            # replaces the old file once it is complete
+            queue_invoice_pdf(instance)
 
         return instance
 
@@ -224,3 +277,9 @@ class InvoiceIsCancelledSerializer(serializers.ModelSerializer):
     class Meta:
         model = Invoice
         fields = ["is_cancelled"]
+
+
+class InvoicePDFStatusSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Invoice
+        fields = ["id", "pdf_status", "invoice_pdf"]
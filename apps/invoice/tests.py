@@ -0,0 +1,375 @@
+import csv
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import Future
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from asgiref.testing import ApplicationCommunicator
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone, translation
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from qms_api.asgi import StreamingASGIHandler
+
+from apps.department.models import Department
+from apps.invoice.models import Invoice, InvoiceSequence
+from apps.invoice.pdf import ensure_invoice_pdfs, render_stale_invoice_pdfs
+from apps.service.models import Service
+from user.models import User
+
+
+# Tests never touch the shared Redis cache the settings point at
+LOCAL_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+}
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class InvoiceQueryCountTests(APITestCase):
+    """Creating and listing invoices cost the same queries at any size."""
+
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name="Department", name_ar="قسم")
+        cls.service = Service.objects.create(
+            name="Service",
+            name_ar="خدمة",
+            service_symbol="A",
+            department=department,
+            gov_fee=Decimal("10"),
+            service_fee=Decimal("5"),
+            typing_fee=Decimal("20"),
+            add_fee=Decimal("1"),
+        )
+        cls.user = User.objects.create_user(
+            email="admin@example.com",
+            mobile_number="0501234567",
+            password="password",
+            name="Admin",
+            name_ar="مدير",
+            identification="784000000000001",
+            position="Manager",
+            is_superuser=True,
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        # URLs carry the language prefix
+        translation.activate("en")
+        self.addCleanup(translation.deactivate)
+
+    def create_invoice(self, line_count):
+        response = self.client.post(
+            reverse("invoice:create invoice"),
+            {
+                "token_no": "A-1",
+                "contact_name": "Customer",
+                "contact_no": "0501234567",
+                "group": "Normal",
+                "line_items": [
+                    {"service": str(self.service.id), "quantity": 2, "fins": "1.00"}
+                ]
+                * line_count,
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def test_create_queries_do_not_grow_with_line_items(self):
+        # The first invoice also creates the ID sequence row
+        self.create_invoice(1)
+
+        with self.assertNumQueries(16):
+            self.create_invoice(1)
+        with self.assertNumQueries(16):
+            self.create_invoice(25)
+
+        invoice = Invoice.objects.latest("created_at")
+        self.assertEqual(invoice.line_items.count(), 25)
+        self.assertEqual(invoice.total_gov_fee, Decimal("500"))
+
+    def test_list_queries_do_not_grow_with_page_size(self):
+        url = reverse("invoice:invoice list") + "?page_size=20"
+        self.create_invoice(2)
+        with self.assertNumQueries(3):
+            self.client.get(url)
+
+        for _ in range(10):
+            self.create_invoice(3)
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["results"]), 11)
+
+
+class InvoiceSequenceTests(TestCase):
+    def test_first_id_continues_after_existing_invoices_of_the_prefix(self):
+        for invoice_id in ["INV000000007", "INVX000000042", "INV0000000099"]:
+            Invoice.objects.create(
+                id=invoice_id,
+                token_no="A-1",
+                contact_name="Customer",
+                contact_no="0501234567",
+            )
+
+        with transaction.atomic():
+            self.assertEqual(InvoiceSequence.next_id("INV"), "INV000000008")
+            self.assertEqual(InvoiceSequence.next_id("INVX"), "INVX000000043")
+
+
+class StaleInvoicePDFTests(TestCase):
+    def setUp(self):
+        self.invoice = Invoice.objects.create(
+            token_no="A-1", contact_name="Customer", contact_no="0501234567"
+        )
+        patcher = mock.patch("apps.invoice.pdf.get_executor")
+        self.executor = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        # _finish closes the connection of the pool's result thread
+        patcher = mock.patch("apps.invoice.pdf.close_old_connections")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_invoices_never_queued_are_not_rendered(self):
+        self.assertEqual(self.invoice.pdf_status, "ready")
+        self.assertEqual(render_stale_invoice_pdfs(stale_after=0), 0)
+        self.executor.submit.assert_not_called()
+
+    def test_stale_pending_render_is_rendered_again(self):
+        Invoice.objects.filter(id=self.invoice.id).update(
+            pdf_status="pending",
+            pdf_requested_at=timezone.now() - timedelta(minutes=10),
+        )
+        future = Future()
+        future.set_result(f"invoices/{self.invoice.id}.pdf")
+        self.executor.submit.return_value = future
+
+        self.assertEqual(render_stale_invoice_pdfs(stale_after=300), 1)
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.pdf_status, "ready")
+        self.assertEqual(
+            self.invoice.invoice_pdf.name, f"invoices/{self.invoice.id}.pdf"
+        )
+
+    def test_export_skips_pending_renders(self):
+        Invoice.objects.filter(id=self.invoice.id).update(pdf_status="pending")
+        self.invoice.refresh_from_db()
+
+        unavailable = ensure_invoice_pdfs([self.invoice])
+
+        self.assertIn(self.invoice.id, unavailable)
+        self.executor.submit.assert_not_called()
+
+    def test_export_render_does_not_replace_a_newer_render(self):
+        Invoice.objects.filter(id=self.invoice.id).update(
+            pdf_status="failed", pdf_hash="queued"
+        )
+        self.invoice.refresh_from_db()
+
+        def submit(*args):
+            # The invoice is edited and its render queued meanwhile
+            Invoice.objects.filter(id=self.invoice.id).update(
+                pdf_status="pending", pdf_hash="newer"
+            )
+            future = Future()
+            future.set_result(f"invoices/{self.invoice.id}-export.pdf")
+            return future
+
+        self.executor.submit.side_effect = submit
+        unavailable = ensure_invoice_pdfs([self.invoice])
+
+        self.assertIn(self.invoice.id, unavailable)
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.pdf_status, "pending")
+        self.assertEqual(self.invoice.pdf_hash, "newer")
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class InvoiceDownloadPDFTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email="admin@example.com",
+            mobile_number="0501234567",
+            password="password",
+            name="Admin",
+            name_ar="مدير",
+            identification="784000000000001",
+            position="Manager",
+            is_superuser=True,
+        )
+        cls.invoice = Invoice.objects.create(
+            token_no="A-1", contact_name="Customer", contact_no="0501234567"
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        translation.activate("en")
+        self.addCleanup(translation.deactivate)
+
+    def download(self):
+        return self.client.get(
+            reverse("invoice:invoice download"), {"invoice_id": self.invoice.id}
+        )
+
+    def test_pending_render_is_not_duplicated(self):
+        Invoice.objects.filter(id=self.invoice.id).update(pdf_status="pending")
+        with mock.patch("apps.invoice.views.render_invoice_pdf_now") as render:
+            response = self.download()
+        self.assertEqual(response.status_code, 202)
+        render.assert_not_called()
+
+    def test_render_failure_is_logged_and_unavailable(self):
+        Invoice.objects.filter(id=self.invoice.id).update(pdf_status="failed")
+        with mock.patch(
+            "apps.invoice.views.render_invoice_pdf_now", side_effect=OSError
+        ), self.assertLogs("apps.invoice.views", "ERROR"):
+            response = self.download()
+        self.assertEqual(response.status_code, 503)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class ASGIExportTestCase(TransactionTestCase):
+    """
+    The exports stream through the ASGI handler the app is served by. The
+    handler runs each request in a thread of its own, with its own database
+    connection, so the test data is committed.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="admin@example.com",
+            mobile_number="0501234567",
+            password="password",
+            name="Admin",
+            name_ar="مدير",
+            identification="784000000000001",
+            position="Manager",
+            is_superuser=True,
+        )
+        Invoice.objects.bulk_create(
+            Invoice(
+                id=f"INV{number:09d}",
+                token_no=f"A-{number}",
+                contact_name="Customer",
+                contact_no="0501234567",
+            )
+            for number in range(1, 1201)
+        )
+        self.token = AccessToken.for_user(self.user)
+
+    async def get(self, path, query_string=b""):
+        """Return the status and the body messages of a GET over ASGI."""
+        communicator = ApplicationCommunicator(
+            StreamingASGIHandler(),
+            {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": "1.1",
+                "method": "GET",
+                "scheme": "http",
+                "path": path,
+                "query_string": query_string,
+                "headers": [
+                    (b"host", b"testserver"),
+                    (b"authorization", f"Bearer {self.token}".encode()),
+                ],
+                "server": ("testserver", 80),
+                "client": ("127.0.0.1", 12345),
+            },
+        )
+        await communicator.send_input({"type": "http.request", "body": b""})
+        start = await communicator.receive_output(timeout=10)
+        parts = []
+        while True:
+            message = await communicator.receive_output(timeout=10)
+            parts.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        return start["status"], parts
+
+
+class CSVExportASGITests(ASGIExportTestCase):
+    async def test_invoice_export_streams_rows(self):
+        status_code, parts = await self.get("/en/api/invoice/invoice_export_csv/")
+
+        self.assertEqual(status_code, 200)
+        # One part per 500 lines instead of a single buffered body
+        self.assertGreater(len([part for part in parts if part]), 1)
+        rows = list(csv.reader(io.StringIO(b"".join(parts).decode())))
+        self.assertEqual(len(rows), 1201)
+        self.assertEqual(rows[1][0], "INV000000001")
+
+    async def test_user_export_streams_rows(self):
+        status_code, parts = await self.get("/en/api/users/employee_export_csv/")
+
+        self.assertEqual(status_code, 200)
+        rows = list(csv.reader(io.StringIO(b"".join(parts).decode())))
+        self.assertEqual(rows[0][0], "Email")
+
+
+class ZIPExportASGITests(ASGIExportTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        # Stored PDFs, so nothing needs rendering
+        os.makedirs(os.path.join(media_root, "invoices"))
+        for invoice in Invoice.objects.filter(id__lte="INV000000003"):
+            name = f"invoices/{invoice.id}.pdf"
+            with open(os.path.join(media_root, name), "wb") as file:
+                file.write(b"%PDF " + invoice.id.encode() * 20000)
+            invoice.contact_name = "Stored"
+            invoice.invoice_pdf = name
+            invoice.pdf_status = "ready"
+            invoice.save(update_fields=["contact_name", "invoice_pdf", "pdf_status"])
+        Invoice.objects.filter(id="INV000000004").update(
+            contact_name="Stored", pdf_status="pending"
+        )
+        Invoice.objects.filter(id="INV000000005").update(
+            contact_name="Stored", pdf_status="failed"
+        )
+
+        # The render of the failed one fails again
+        future = Future()
+        future.set_exception(OSError())
+        patcher = mock.patch("apps.invoice.pdf.get_executor")
+        patcher.start().return_value.submit.return_value = future
+        self.addCleanup(patcher.stop)
+
+    async def test_zip_export_streams_stored_pdfs(self):
+        with self.assertLogs("apps.invoice.pdf", "ERROR"):
+            status_code, parts = await self.get(
+                "/en/api/invoice/invoice_bulk_export/", b"contact_name=Stored"
+            )
+
+        self.assertEqual(status_code, 200)
+        self.assertGreater(len([part for part in parts if part]), 1)
+        with zipfile.ZipFile(io.BytesIO(b"".join(parts))) as archive:
+            self.assertEqual(
+                archive.namelist(),
+                [f"INV00000000{number}.pdf" for number in range(1, 4)]
+                + ["missing.txt"],
+            )
+            self.assertEqual(
+                archive.read("INV000000002.pdf"), b"%PDF " + b"INV000000002" * 20000
+            )
+            self.assertEqual(
+                archive.read("missing.txt").decode().splitlines(),
+                [
+                    "INV000000004: The PDF is still being generated.",
+                    "INV000000005: The PDF could not be generated.",
+                ],
+            )
@@ -8,6 +8,10 @@ from apps.invoice.views import (
     InvoiceUpdateview,
     InvoiceCancelView,
     InvoiceDownloadPDFView,
+    InvoicePDFStatusView,
+    InvoiceBulkExportView,
+    InvoiceExportCSVView,
+    InvoiceLineItemExportCSVView,
     InvoiceDeleteview,
     InvoiceDialogView,
 )
@@ -28,6 +32,20 @@ urlpatterns = [
     path(
         "invoice_download/", InvoiceDownloadPDFView.as_view(), name="invoice download"
     ),
+    path(
+        "invoice_pdf_status/", InvoicePDFStatusView.as_view(), name="invoice pdf status"
+    ),
+    path(
+        "invoice_bulk_export/", InvoiceBulkExportView.as_view(), name="invoice bulk export"
+    ),
+    path(
+        "invoice_export_csv/", InvoiceExportCSVView.as_view(), name="invoice export csv"
+    ),
+    path(
+        "invoice_line_item_export_csv/",
+        InvoiceLineItemExportCSVView.as_view(),
+        name="invoice line item export csv",
+    ),
     path("invoice_delete/", InvoiceDeleteview.as_view(), name="invoice delete"),
     path("invoice_dialog/", InvoiceDialogView.as_view(), name="invoice dialog"),
 ]
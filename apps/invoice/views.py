@@ -2,6 +2,8 @@ from django.utils.translation import gettext_lazy as _
 from django.shortcuts import get_object_or_404
 from django.http import FileResponse, Http404
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
 
 from rest_framework import generics, status
 from rest_framework.response import Response
@@ -10,25 +12,40 @@ from rest_framework.filters import SearchFilter, OrderingFilter
 from rest_framework.throttling import UserRateThrottle
 from django_filters.rest_framework import DjangoFilterBackend
 
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from qms_api.authentication import CachedJWTAuthentication
 
 from apps.invoice.models import Invoice, InvoiceLineItem
 from apps.invoice.serializers import (
     InvoiceSerializer,
     InvoiceDialogSerializer,
     InvoiceIsCancelledSerializer,
+    InvoicePDFStatusSerializer,
 )
 from apps.invoice.filters import InvoiceFilter
+from apps.report.models import RevenueRollup
+from apps.invoice.pdf import (
+    pdf_file_exists,
+    render_invoice_pdf_now,
+    stream_invoice_pdfs_zip,
+)
 
-from qms_api.pagination import StandardResultsSetPagination
+from qms_api.pagination import (
+    KeysetResultsSetPagination,
+    StandardResultsSetPagination,
+)
 from qms_api.custom_permissions import HasPermissionOrInGroupWithPermission
+from qms_api.util import AsyncStreamingHttpResponse, csv_export_response
 
+import logging
 import os
 
 
+logger = logging.getLogger(__name__)
+
+
 class InvoiceCreateView(generics.CreateAPIView):
     serializer_class = InvoiceSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "invoice.add_invoice"
 
@@ -46,13 +63,24 @@ class InvoiceCreateView(generics.CreateAPIView):
         )
 
 
+def invoice_list_queryset():
+    """Invoices with the rows their serializer reads joined or prefetched."""
+    return Invoice.objects.select_related("created_by", "updated_by").prefetch_related(
+        Prefetch(
+            "line_items",
+            queryset=InvoiceLineItem.objects.select_related("service__department"),
+        )
+    )
+
+
 class InvoiceListView(generics.ListAPIView):
-    queryset = Invoice.objects.all().order_by("-created_at")
+    # A page costs a fixed number of queries whatever its size
+    queryset = invoice_list_queryset().order_by("-created_at")
     serializer_class = InvoiceSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "invoice.view_invoice"
-    pagination_class = StandardResultsSetPagination
+    pagination_class = KeysetResultsSetPagination
     filter_backends = [SearchFilter, OrderingFilter, DjangoFilterBackend]
     filterset_class = InvoiceFilter
     ordering_fields = [
@@ -65,7 +93,7 @@ class InvoiceListView(generics.ListAPIView):
 
 class InvoiceRetrieve(generics.RetrieveAPIView):
     serializer_class = InvoiceSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "invoice.view_invoice"
     lookup_field = "id"
@@ -77,9 +105,9 @@ class InvoiceRetrieve(generics.RetrieveAPIView):
 
 
 class InvoiceCanceledListView(generics.ListAPIView):
-    queryset = Invoice.objects.filter(is_cancelled=True).order_by("-created_at")
+    queryset = invoice_list_queryset().filter(is_cancelled=True).order_by("-created_at")
     serializer_class = InvoiceSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "invoice.view_invoice"
     pagination_class = StandardResultsSetPagination
@@ -95,7 +123,7 @@ class InvoiceCanceledListView(generics.ListAPIView):
 
 class InvoiceUpdateview(generics.UpdateAPIView):
     serializer_class = InvoiceSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "invoice.change_invoice"
     lookup_field = "id"
@@ -147,8 +175,10 @@ class InvoiceCancelView(generics.UpdateAPIView):
         instance.is_cancelled = True
         instance.receipt_no = ""  # Clear receipt_no
         instance.is_paid = False  # Ensure is_paid is False
-        # Save the updated instance
-        instance.save()
+        # Save the updated instance and take it out of the revenue reports
+        with transaction.atomic():
+            instance.save()
+            RevenueRollup.apply_invoice(instance)
 
         return Response(
             {
@@ -159,7 +189,7 @@ class InvoiceCancelView(generics.UpdateAPIView):
 
 
 class InvoiceDeleteview(generics.DestroyAPIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "invoice.delete_invoice"
 
@@ -176,7 +206,7 @@ class InvoiceDeleteview(generics.DestroyAPIView):
 
 
 class InvoiceDownloadPDFView(generics.RetrieveAPIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "invoice.view_invoice"
     throttle_classes=[UserRateThrottle]
@@ -187,32 +217,214 @@ class InvoiceDownloadPDFView(generics.RetrieveAPIView):
         invoice = get_object_or_404(Invoice, id=invoice_id)
         return invoice
 
+    def pending_response(self, invoice):
+        response = Response(
+            {
+                "detail": _("The invoice PDF is being generated."),
+                "pdf_status": invoice.pdf_status,
+            },
+            status=status.HTTP_202_ACCEPTED,
+        )
+        response["Retry-After"] = "2"
+        return response
+
     def retrieve(self, request, *args, **kwargs):
         # Fetch the invoice object
         invoice = self.get_object()
 
+        # The PDF is rendered in the background after create/update; rendering
+        # it here as well would only duplicate that work
+        if invoice.pdf_status == "pending":
+            return self.pending_response(invoice)
+
+        # A failed render, or a ready PDF whose file is gone: render it now
+        if invoice.pdf_status != "ready" or not pdf_file_exists(invoice):
+            try:
+                render_invoice_pdf_now(invoice)
+            except Exception:
+                logger.exception("Rendering the PDF of invoice %s failed", invoice.id)
+                return Response(
+                    {"detail": _("The invoice PDF could not be generated.")},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                )
+            # The invoice changed while rendering and a newer render is queued
+            if invoice.pdf_status == "pending":
+                return self.pending_response(invoice)
+
         # Get the file path from the invoice_pdf field
         file_path = os.path.join(settings.MEDIA_ROOT, str(invoice.invoice_pdf))
 
-        # Check if the file exists
-        if not os.path.exists(file_path):
-            raise Http404("Invoice PDF not found")
-
         # Open the file and return it as a downloadable response
         try:
             response = FileResponse(
                 open(file_path, "rb"), content_type="application/pdf"
             )
             response["Content-Disposition"] = (
-                f'attachment; filename="{os.path.basename(file_path)}"'
+                f'attachment; filename="{invoice.id}.pdf"'
             )
             return response
         except Exception as e:
             raise Http404("Error opening the file")
 
 
+class InvoiceBulkExportView(generics.ListAPIView):
+    """
+    Download the PDFs of many invoices at once, selected with the
+    InvoiceFilter parameters (e.g. ``created_from``/``created_to``), as a
+    streamed ZIP (``export_format=zip``, the only format).
+    """
+
+    queryset = Invoice.objects.all().order_by("created_at", "id")
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
+    permission_codename = "invoice.view_invoice"
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = InvoiceFilter
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        export_format = request.query_params.get("export_format", "zip")
+
+        if export_format == "zip":
+            response = AsyncStreamingHttpResponse(
+                stream_invoice_pdfs_zip(queryset), content_type="application/zip"
+            )
+            response["Content-Disposition"] = 'attachment; filename="invoices.zip"'
+            return response
+
+        return Response(
+            {"detail": _("export_format must be 'zip'")},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+
+class InvoiceExportCSVView(generics.ListAPIView):
+    """Stream the invoices selected with the InvoiceFilter parameters as CSV."""
+
+    queryset = Invoice.objects.all().order_by("created_at", "id")
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
+    permission_codename = "invoice.view_invoice"
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = InvoiceFilter
+
+    def list(self, request, *args, **kwargs):
+        return csv_export_response(
+            "invoices.csv",
+            [
+                _("ID"),
+                _("Token No"),
+                _("Receipt No"),
+                _("Group"),
+                _("PRO"),
+                _("Contact Name"),
+                _("Contact No"),
+                _("Company Name"),
+                _("Company Number"),
+                _("Company Tax Number"),
+                _("Total Gov Fee"),
+                _("Total Service Fee"),
+                _("Total Typing Fee"),
+                _("VAT"),
+                _("Total Additional Fee"),
+                _("Total Fins"),
+                _("Grand Total"),
+                _("Is Paid"),
+                _("Is Cancelled"),
+                _("PRO Commission"),
+                _("Employee Commission"),
+                _("System Commission"),
+                _("Created At"),
+                _("Created By"),
+            ],
+            self.filter_queryset(self.get_queryset()),
+            [
+                "id",
+                "token_no",
+                "receipt_no",
+                "group",
+                "pro__name",
+                "contact_name",
+                "contact_no",
+                "company_name",
+                "company_number",
+                "company_tax_number",
+                "total_gov_fee",
+                "total_service_fee",
+                "total_typing_fee",
+                "vat",
+                "total_additional_fee",
+                "total_fins",
+                "grand_total",
+                "is_paid",
+                "is_cancelled",
+                "pro_commission",
+                "employee_commission",
+                "system_commission",
+                "created_at",
+                "created_by__name",
+            ],
+        )
+
+
+class InvoiceLineItemExportCSVView(generics.ListAPIView):
+    """
+    Stream the line items of the invoices selected with the InvoiceFilter
+    parameters as CSV.
+    """
+
+    queryset = Invoice.objects.all()
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
+    permission_codename = "invoice.view_invoice"
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = InvoiceFilter
+
+    def list(self, request, *args, **kwargs):
+        invoices = self.filter_queryset(self.get_queryset())
+        return csv_export_response(
+            "invoice_line_items.csv",
+            [
+                _("Invoice ID"),
+                _("Service"),
+                _("Quantity"),
+                _("Gov Total"),
+                _("Fins"),
+                _("Reference No 1"),
+                _("Reference No 2"),
+                _("Reference No 3"),
+            ],
+            InvoiceLineItem.objects.filter(invoice__in=invoices).order_by(
+                "invoice_id", "id"
+            ),
+            [
+                "invoice_id",
+                "service__name",
+                "quantity",
+                "gov_total",
+                "fins",
+                "ref_no1",
+                "ref_no2",
+                "ref_no3",
+            ],
+        )
+
+
+class InvoicePDFStatusView(generics.RetrieveAPIView):
+    serializer_class = InvoicePDFStatusSerializer
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
+    permission_codename = "invoice.view_invoice"
+    lookup_field = "id"
+
+    def get_object(self):
+        invoice_id = self.request.query_params.get("invoice_id")
+        invoice = get_object_or_404(Invoice, id=invoice_id)
+        return invoice
+
+
 class InvoiceDialogView(generics.ListAPIView):
     queryset = Invoice.objects.filter(is_cancelled=False).order_by("-created_at")
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
     serializer_class = InvoiceDialogSerializer
@@ -0,0 +1,9 @@
+from django.contrib import admin
+
+from apps.outbox.models import OutboxEvent
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ("id", "group", "created_at", "available_at", "attempts")
+    list_filter = ("group",)
@@ -0,0 +1,89 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from apps.outbox.models import OutboxEvent
+
+
+logger = logging.getLogger(__name__)
+
+# Message type -> callable receiving the messages of that type in a batch,
+# for events that are better sent combined (e.g. display board deltas)
+batch_handlers = {}
+
+
+def register_batch_handler(message_type, handler):
+    batch_handlers[message_type] = handler
+
+
+class OutboxDispatcher:
+    """
+    Sends outbox events to the channel layer in batches.
+
+    Several dispatchers may run side by side: a batch is claimed with
+    ``SELECT ... FOR UPDATE SKIP LOCKED`` and a lease, and events are only
+    deleted after they were sent, so every event is delivered at least once.
+    """
+
+    def __init__(self, batch_size=100, lease=30):
+        self.batch_size = batch_size
+        self.lease = timedelta(seconds=lease)
+
+    def claim(self):
+        now = timezone.now()
+        with transaction.atomic():
+            events = list(
+                OutboxEvent.objects.select_for_update(skip_locked=True)
+                .filter(available_at__lte=now)
+                .order_by("id")[: self.batch_size]
+            )
+            OutboxEvent.objects.filter(id__in=[event.id for event in events]).update(
+                available_at=now + self.lease, attempts=F("attempts") + 1
+            )
+        return events
+
+    def send(self, events):
+        """Send ``events`` and return the ids of those that went out."""
+        channel_layer = get_channel_layer()
+        sent = []
+        batched = {}
+        for event in events:
+            message_type = event.message.get("type")
+            if message_type in batch_handlers:
+                batched.setdefault(message_type, []).append(event)
+                continue
+            try:
+                async_to_sync(channel_layer.group_send)(event.group, event.message)
+            except Exception:
+                logger.exception("Sending outbox event %s failed", event.id)
+            else:
+                sent.append(event.id)
+
+        for message_type, type_events in batched.items():
+            try:
+                batch_handlers[message_type]([event.message for event in type_events])
+            except Exception:
+                logger.exception("Sending %s outbox events failed", message_type)
+            else:
+                sent.extend(event.id for event in type_events)
+        return sent
+
+    def dispatch_batch(self):
+        """Send one batch of due events and return how many were claimed."""
+        events = self.claim()
+        if events:
+            sent = self.send(events)
+            OutboxEvent.objects.filter(id__in=sent).delete()
+        return len(events)
+
+    def run(self, interval):
+        while True:
+            if not self.dispatch_batch():
+                time.sleep(interval)
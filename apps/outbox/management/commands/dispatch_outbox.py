@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.outbox.dispatcher import OutboxDispatcher
+
+
+class Command(BaseCommand):
+    help = "Send queued outbox events (ticket and invoice notifications) to the channel layer."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=getattr(settings, "OUTBOX_POLL_INTERVAL", 0.05),
+            help="Seconds to wait when there is nothing to send.",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Send one batch and exit."
+        )
+
+    def handle(self, *args, **options):
+        dispatcher = OutboxDispatcher(batch_size=options["batch_size"])
+        if options["once"]:
+            count = dispatcher.dispatch_batch()
+            self.stdout.write(f"Dispatched {count} outbox events.")
+            return
+        self.stdout.write("Dispatching outbox events...")
+        dispatcher.run(options["interval"])
@@ -0,0 +1,35 @@
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+
+class OutboxEvent(models.Model):
+    """
+    A channel layer message waiting to be sent by the outbox dispatcher.
+
+    Events are written in the same transaction as the change they describe,
+    so they exist exactly when that change is committed, and HTTP writes never
+    wait on the channel layer. An event is deleted once it has been sent.
+    """
+
+    group = models.CharField(_("Group"), max_length=255)
+    message = models.JSONField(_("Message"))
+    created_at = models.DateTimeField(_("Created At"), auto_now_add=True)
+    # Events are claimed by pushing this forward; a dispatcher that dies
+    # before sending lets the claim run out and another one sends the event
+    available_at = models.DateTimeField(_("Available At"), default=timezone.now)
+    attempts = models.PositiveIntegerField(_("Attempts"), default=0)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["available_at", "id"], name="outbox_available_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.group}: {self.message.get('type')}"
+
+    @classmethod
+    def publish(cls, group, message):
+        """Queue ``message`` for ``group``; call inside the writing transaction."""
+        return cls.objects.create(group=group, message=message)
@@ -0,0 +1,48 @@
+from django.contrib.auth.models import Permission, Group
+from django.db import transaction
+from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete, m2m_changed
+
+from apps.counter.models import Counter
+from qms_api.authentication import user_principals
+from qms_api.custom_permissions import user_permissions
+from user.models import User
+
+
+def invalidate_permissions():
+    user_permissions.invalidate()
+    user_principals.invalidate()
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def permissions_changed(sender, action, **kwargs):
+    """
+    Drop the cached user permissions once permissions are assigned to or
+    removed from users and groups, or users join or leave groups.
+    """
+    if action in ("post_add", "post_remove", "post_clear"):
+        transaction.on_commit(invalidate_permissions)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Permission)
+def group_or_permission_changed(sender, **kwargs):
+    """Deleted groups and permissions, and group names in login profiles."""
+    transaction.on_commit(invalidate_permissions)
+
+
+@receiver(post_save, sender=Counter)
+@receiver(post_delete, sender=Counter)
+def counter_changed(sender, **kwargs):
+    """Cached users carry the IDs of their counters."""
+    transaction.on_commit(user_principals.invalidate)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    """Drop the cached copy of a changed or deleted user."""
+    transaction.on_commit(lambda: user_principals.forget(instance.pk))
@@ -6,7 +6,7 @@ from rest_framework.response import Response
 from rest_framework import generics, status
 from rest_framework.permissions import IsAuthenticated
 
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from qms_api.authentication import CachedJWTAuthentication
 
 from apps.permissions_api.serializers import (
     PermissionSerializer,
@@ -24,7 +24,7 @@ from user.serializers import UserSerializer
 class PermissionListView(generics.ListAPIView):
     queryset = Permission.objects.all()
     serializer_class = PermissionSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "view_permission"
 
@@ -34,14 +34,14 @@ class PermissionListView(generics.ListAPIView):
 class PermissionDialogView(generics.ListAPIView):
     queryset = Permission.objects.all()
     serializer_class = PermissionDialogSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "view_permission"
 
 
 
 class AssignPermissionsToGroupView(generics.CreateAPIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "add_permission"
 
@@ -67,7 +67,7 @@ class AssignPermissionsToGroupView(generics.CreateAPIView):
 
 
 class AssignPermissionsToUserView(generics.CreateAPIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "add_permission"
 
@@ -93,7 +93,7 @@ class AssignPermissionsToUserView(generics.CreateAPIView):
 
 
 class RemovePermissionsFromGroupView(generics.UpdateAPIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "change_group"
 
@@ -119,7 +119,7 @@ class RemovePermissionsFromGroupView(generics.UpdateAPIView):
 
 
 class RemovePermissionsFromUserView(generics.UpdateAPIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "change_permission"
 
@@ -148,7 +148,7 @@ class RemovePermissionsFromUserView(generics.UpdateAPIView):
 class GroupListView(generics.ListAPIView):
     queryset = Group.objects.all()
     serializer_class = GroupSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "view_group"
 
@@ -156,7 +156,7 @@ class GroupListView(generics.ListAPIView):
 
 class GroupRetrieveView(generics.RetrieveAPIView):
     serializer_class=GroupSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "view_group"
     lookup_field = "id"
@@ -167,7 +167,7 @@ class GroupRetrieveView(generics.RetrieveAPIView):
 
 class GroupCreateView(generics.CreateAPIView):
     serializer_class = GroupSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "add_group"
 
@@ -191,7 +191,7 @@ class GroupCreateView(generics.CreateAPIView):
 
 class GroupUpdateView(generics.UpdateAPIView):
     serializer_class = GroupSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "change_group"
 
@@ -214,7 +214,7 @@ class GroupUpdateView(generics.UpdateAPIView):
         )
 class GroupUpdatePermissionsView(generics.UpdateAPIView):
     serializer_class = GroupSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "change_group"
 
@@ -242,7 +242,7 @@ class GroupUpdatePermissionsView(generics.UpdateAPIView):
 
 class GroupDeleteView(generics.DestroyAPIView):
     serializer_class = GroupSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "delete_group"
 
@@ -270,7 +270,7 @@ class GroupDeleteView(generics.DestroyAPIView):
 class GroupDialogView(generics.ListAPIView):
     queryset = Group.objects.all()
     serializer_class = GroupDialogSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "view_group"
 
@@ -278,7 +278,7 @@ class GroupDialogView(generics.ListAPIView):
 
 class AssignUserToGroupView(generics.UpdateAPIView):
     serializer_class = UserSerializer  # Replace with your User serializer
-    authentication_classes = [JWTAuthentication]  # Add your authentication classes
+    authentication_classes = [CachedJWTAuthentication]  # Add your authentication classes
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "change_group"
 
@@ -312,7 +312,7 @@ class AssignUserToGroupView(generics.UpdateAPIView):
 
 class AssignManyUsersToGroupView(generics.UpdateAPIView):
     serializer_class = UserSerializer  # Use your User serializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "change_group"
 
@@ -350,7 +350,7 @@ class AssignManyUsersToGroupView(generics.UpdateAPIView):
 class RemoveUserFromGroupView(generics.UpdateAPIView):
     serializer_class = UserSerializer
     queryset = User.objects.all()  # This queryset can be customized based on your needs
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "change_group"
 
@@ -381,7 +381,7 @@ class RemoveUserFromGroupView(generics.UpdateAPIView):
 
 class RemoveManyUsersFromGroupView(generics.UpdateAPIView):
     serializer_class = UserSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "change_group"
 
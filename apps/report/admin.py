@@ -0,0 +1,9 @@
+from django.contrib import admin
+
+from apps.report.models import RevenueRollup
+
+
+@admin.register(RevenueRollup)
+class RevenueRollupAdmin(admin.ModelAdmin):
+    list_display = ("date", "department", "service", "pro", "employee", "grand_total")
+    list_filter = ("date",)
@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Prefetch
+
+from apps.invoice.models import Invoice, InvoiceLineItem
+from apps.report.models import (
+    RevenueRollup,
+    RevenueRollupEntry,
+    COUNT_FIELDS,
+    AMOUNT_FIELDS,
+)
+
+
+class Command(BaseCommand):
+    help = "Rebuild the revenue rollups from all invoices."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        invoices = Invoice.objects.prefetch_related(
+            Prefetch(
+                "line_items",
+                queryset=InvoiceLineItem.objects.select_related("service"),
+            )
+        ).order_by("created_at", "id")
+
+        with transaction.atomic():
+            # Invoice writes wait until the rebuilt rollups are committed and
+            # then apply their changes on top of them
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "LOCK TABLE {}, {} IN EXCLUSIVE MODE".format(
+                        connection.ops.quote_name(RevenueRollupEntry._meta.db_table),
+                        connection.ops.quote_name(RevenueRollup._meta.db_table),
+                    )
+                )
+            RevenueRollupEntry.objects.all().delete()
+            RevenueRollup.objects.all().delete()
+
+            totals = {}
+            entries = []
+            count = 0
+            for invoice in invoices.iterator(chunk_size=chunk_size):
+                rows = RevenueRollup.invoice_rows(invoice, invoice.line_items.all())
+                for key, row in rows.items():
+                    total = totals.setdefault(
+                        key,
+                        {
+                            **row,
+                            **dict.fromkeys(COUNT_FIELDS + AMOUNT_FIELDS, 0),
+                        },
+                    )
+                    for name in COUNT_FIELDS + AMOUNT_FIELDS:
+                        total[name] += row[name]
+                entries.append(
+                    RevenueRollupEntry(
+                        invoice_id=invoice.id, rows=RevenueRollup.json_rows(rows)
+                    )
+                )
+                if len(entries) >= chunk_size:
+                    RevenueRollupEntry.objects.bulk_create(entries)
+                    entries = []
+                count += 1
+            RevenueRollupEntry.objects.bulk_create(entries)
+
+            keys = sorted(totals)
+            for start in range(0, len(keys), chunk_size):
+                RevenueRollup.add(
+                    {key: totals[key] for key in keys[start : start + chunk_size]}
+                )
+
+        self.stdout.write(
+            f"Rebuilt {len(totals)} revenue rollup rows from {count} invoices."
+        )
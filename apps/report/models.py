@@ -0,0 +1,287 @@
+from django.db import models, connection, transaction
+from django.conf import settings
+from django.dispatch import receiver
+from django.db.models.signals import pre_delete
+from django.utils import timezone
+
+from apps.department.models import Department
+from apps.service.models import Service
+from apps.PRO.models import PRO
+from apps.invoice.models import Invoice
+
+from decimal import Decimal, ROUND_HALF_UP
+
+
+DIMENSION_FIELDS = ["date", "department", "service", "pro", "employee"]
+COUNT_FIELDS = ["line_count", "quantity"]
+COMMISSION_FIELDS = ["pro_commission", "employee_commission", "system_commission"]
+AMOUNT_FIELDS = [
+    "gov_fee",
+    "service_fee",
+    "typing_fee",
+    "additional_fee",
+    "vat",
+    "fins",
+    "grand_total",
+] + COMMISSION_FIELDS
+CENT = Decimal("0.01")
+
+
+class RevenueRollup(models.Model):
+    """
+    Revenue and commissions of the non-cancelled invoices of one day, per
+    department, service, PRO and employee (the user who created the invoice).
+
+    The rows are updated in the transaction that writes an invoice, so finance
+    reports sum a handful of rows per day instead of scanning every invoice.
+    """
+
+    # date|department|service|pro|employee, the conflict target of the upserts
+    key = models.CharField(max_length=200, unique=True)
+    date = models.DateField()
+    department = models.ForeignKey(
+        Department,
+        blank=True,
+        null=True,
+        related_name="revenue_rollups",
+        on_delete=models.SET_NULL,
+        db_index=False,
+    )
+    service = models.ForeignKey(
+        Service,
+        blank=True,
+        null=True,
+        related_name="revenue_rollups",
+        on_delete=models.SET_NULL,
+        db_index=False,
+    )
+    pro = models.ForeignKey(
+        PRO,
+        blank=True,
+        null=True,
+        related_name="revenue_rollups",
+        on_delete=models.SET_NULL,
+        db_index=False,
+    )
+    employee = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        blank=True,
+        null=True,
+        related_name="revenue_rollups",
+        on_delete=models.SET_NULL,
+        db_index=False,
+    )
+    line_count = models.IntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+    gov_fee = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    service_fee = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    typing_fee = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    additional_fee = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    vat = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    fins = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    grand_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    pro_commission = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    employee_commission = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0
+    )
+    system_commission = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["date"], name="revenue_date_idx"),
+            models.Index(
+                fields=["department", "date"], name="revenue_department_date_idx"
+            ),
+            models.Index(fields=["service", "date"], name="revenue_service_date_idx"),
+            models.Index(fields=["pro", "date"], name="revenue_pro_date_idx"),
+            models.Index(fields=["employee", "date"], name="revenue_employee_date_idx"),
+        ]
+
+    @staticmethod
+    def invoice_rows(invoice, line_items):
+        """
+        The rollup rows ``invoice`` contributes, as ``{key: row}``. A cancelled
+        invoice contributes nothing. The invoice commissions are split over
+        its line items by typing fee, the rounding rest going to the last row
+        so the rows add up to the invoice exactly.
+        """
+        if invoice.is_cancelled:
+            return {}
+
+        date = timezone.localdate(invoice.created_at)
+        typing_total = Decimal(invoice.total_typing_fee)
+        commissions = {
+            # Rounded the way the database stores them
+            name: Decimal(getattr(invoice, name)).quantize(CENT, ROUND_HALF_UP)
+            for name in COMMISSION_FIELDS
+        }
+        remaining = dict(commissions)
+        rows = {}
+        row = None
+        for item in line_items:
+            quantity = Decimal(item.quantity)
+            service = item.service
+            amounts = {
+                "gov_fee": Decimal(item.gov_total),
+                "service_fee": quantity * Decimal(service.service_fee),
+                "typing_fee": quantity * Decimal(service.typing_fee),
+                "additional_fee": quantity * Decimal(service.add_fee),
+                "vat": quantity * Decimal(service.vat),
+                "fins": Decimal(item.fins),
+            }
+            amounts["grand_total"] = sum(amounts.values())
+            share = amounts["typing_fee"] / typing_total if typing_total else 0
+            for name in COMMISSION_FIELDS:
+                amount = (commissions[name] * share).quantize(CENT, ROUND_HALF_UP)
+                amounts[name] = amount
+                remaining[name] -= amount
+
+            dimensions = {
+                "date": date.isoformat(),
+                "department": str(service.department_id),
+                "service": str(service.id),
+                "pro": str(invoice.pro_id) if invoice.pro_id else None,
+                "employee": (
+                    str(invoice.created_by_id) if invoice.created_by_id else None
+                ),
+            }
+            key = "|".join(dimensions[name] or "" for name in DIMENSION_FIELDS)
+            row = rows.setdefault(
+                key,
+                {
+                    **dimensions,
+                    **dict.fromkeys(COUNT_FIELDS, 0),
+                    **dict.fromkeys(AMOUNT_FIELDS, Decimal(0)),
+                },
+            )
+            row["line_count"] += 1
+            row["quantity"] += item.quantity
+            for name in AMOUNT_FIELDS:
+                row[name] += amounts[name]
+
+        if row is not None:
+            for name in COMMISSION_FIELDS:
+                row[name] += remaining[name]
+        return rows
+
+    @staticmethod
+    def difference(rows, subtract):
+        """``rows - subtract`` per key, leaving out keys that did not change."""
+        delta = {}
+        for key in rows.keys() | subtract.keys():
+            new = rows.get(key)
+            old = subtract.get(key)
+            row = {name: (new or old)[name] for name in DIMENSION_FIELDS}
+            for name in COUNT_FIELDS:
+                row[name] = (new[name] if new else 0) - (old[name] if old else 0)
+            for name in AMOUNT_FIELDS:
+                row[name] = Decimal(new[name] if new else 0) - Decimal(
+                    old[name] if old else 0
+                )
+            if any(row[name] for name in COUNT_FIELDS + AMOUNT_FIELDS):
+                delta[key] = row
+        return delta
+
+    @staticmethod
+    def json_rows(rows):
+        """``{key: row}`` with the amounts as strings, to store as JSON."""
+        return {
+            key: {
+                name: str(value) if name in AMOUNT_FIELDS else value
+                for name, value in row.items()
+            }
+            for key, row in rows.items()
+        }
+
+    @classmethod
+    def add(cls, rows):
+        """Add ``{key: row}`` amounts to the rollups in a single upsert."""
+        if not rows:
+            return
+
+        table = connection.ops.quote_name(cls._meta.db_table)
+        columns = ["key"] + [
+            cls._meta.get_field(name).column
+            for name in DIMENSION_FIELDS + COUNT_FIELDS + AMOUNT_FIELDS
+        ]
+        assignments = ", ".join(
+            f"{column} = {table}.{column} + EXCLUDED.{column}"
+            for column in columns[len(DIMENSION_FIELDS) + 1 :]
+        )
+        placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+        params = []
+        # A fixed order keeps concurrent writers from deadlocking on the rows
+        for key in sorted(rows):
+            row = rows[key]
+            params.append(key)
+            params.extend(row[name] for name in DIMENSION_FIELDS)
+            params.extend(row[name] for name in COUNT_FIELDS)
+            params.extend(Decimal(row[name]) for name in AMOUNT_FIELDS)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} ({", ".join(columns)})
+                VALUES {", ".join([placeholders] * len(rows))}
+                ON CONFLICT (key) DO UPDATE SET {assignments}
+                """,
+                params,
+            )
+
+    @classmethod
+    def apply_invoice(cls, invoice, line_items=None):
+        """
+        Bring the rollups in line with ``invoice``: the rows it contributed
+        when last applied are replaced by the rows it contributes now. Call
+        inside the transaction that writes the invoice, once its line items
+        are stored; pass the line items when they are at hand already.
+        """
+        if line_items is None:
+            line_items = invoice.line_items.select_related("service")
+
+        with transaction.atomic():
+            entry = (
+                RevenueRollupEntry.objects.select_for_update()
+                .filter(invoice_id=invoice.id)
+                .first()
+            )
+            rows = cls.invoice_rows(invoice, line_items)
+            cls.add(cls.difference(rows, entry.rows if entry else {}))
+
+            stored_rows = cls.json_rows(rows)
+            if entry:
+                entry.rows = stored_rows
+                entry.save(update_fields=["rows"])
+            else:
+                RevenueRollupEntry.objects.create(invoice=invoice, rows=stored_rows)
+
+    @classmethod
+    def remove_invoice(cls, invoice):
+        """Take everything ``invoice`` contributed out of the rollups."""
+        with transaction.atomic():
+            entry = (
+                RevenueRollupEntry.objects.select_for_update()
+                .filter(invoice_id=invoice.id)
+                .first()
+            )
+            if entry:
+                cls.add(cls.difference({}, entry.rows))
+                entry.delete()
+
+
+class RevenueRollupEntry(models.Model):
+    """The rollup rows an invoice contributed when it was last applied."""
+
+    invoice = models.OneToOneField(
+        Invoice,
+        primary_key=True,
+        related_name="revenue_rollup_entry",
+        on_delete=models.CASCADE,
+    )
+    rows = models.JSONField(default=dict)
+
+
+@receiver(pre_delete, sender=Invoice)
+def remove_invoice_revenue(sender, instance, **kwargs):
+    """Subtract a deleted invoice from the revenue rollups."""
+    RevenueRollup.remove_invoice(instance)
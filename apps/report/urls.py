@@ -0,0 +1,9 @@
+from django.urls import path
+
+from apps.report.views import RevenueReportView
+
+app_name = "report"
+
+urlpatterns = [
+    path("revenue_report/", RevenueReportView.as_view(), name="revenue report"),
+]
@@ -0,0 +1,100 @@
+import uuid
+
+from django.utils.translation import gettext_lazy as _
+from django.utils.dateparse import parse_date
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth, TruncYear
+
+from rest_framework import generics, status
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+
+from qms_api.authentication import CachedJWTAuthentication
+
+from apps.report.models import RevenueRollup, COUNT_FIELDS, AMOUNT_FIELDS
+
+from qms_api.custom_permissions import HasPermissionOrInGroupWithPermission
+
+
+# group_by value -> (annotations, fields of each result row)
+REVENUE_GROUPS = {
+    "date": ({}, ["date"]),
+    "month": ({"month": TruncMonth("date")}, ["month"]),
+    "year": ({"year": TruncYear("date")}, ["year"]),
+    "department": ({}, ["department_id", "department__name", "department__name_ar"]),
+    "service": ({}, ["service_id", "service__name", "service__name_ar"]),
+    "pro": ({}, ["pro_id", "pro__name", "pro__name_ar"]),
+    "employee": ({}, ["employee_id", "employee__name"]),
+}
+REVENUE_FILTERS = ["department_id", "service_id", "pro_id", "employee_id"]
+
+
+class RevenueReportView(generics.GenericAPIView):
+    """
+    Revenue and commission totals from the daily rollups.
+
+    ``date_from``/``date_to`` bound the period, ``group_by`` takes a comma
+    separated list of date, month, year, department, service, pro and
+    employee, and ``department_id``, ``service_id``, ``pro_id`` and
+    ``employee_id`` narrow the report down.
+    """
+
+    queryset = RevenueRollup.objects.all()
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
+    permission_codename = "report.view_revenuerollup"
+
+    def get(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        params = request.query_params
+
+        for name, lookup in (("date_from", "date__gte"), ("date_to", "date__lte")):
+            if params.get(name):
+                value = parse_date(params[name])
+                if value is None:
+                    return Response(
+                        {
+                            "detail": _("%(name)s must be a date (YYYY-MM-DD)")
+                            % {"name": name}
+                        },
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+                queryset = queryset.filter(**{lookup: value})
+        for name in REVENUE_FILTERS:
+            if params.get(name):
+                try:
+                    value = uuid.UUID(params[name])
+                except ValueError:
+                    return Response(
+                        {"detail": _("%(name)s must be a UUID") % {"name": name}},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+                queryset = queryset.filter(**{name: value})
+
+        group_by = [name for name in params.get("group_by", "date").split(",") if name]
+        if not group_by or any(name not in REVENUE_GROUPS for name in group_by):
+            return Response(
+                {
+                    "detail": _("group_by must be a list of: %(groups)s")
+                    % {"groups": ", ".join(REVENUE_GROUPS)}
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        totals = {name: Sum(name) for name in COUNT_FIELDS + AMOUNT_FIELDS}
+        annotations = {}
+        fields = []
+        for name in group_by:
+            annotations.update(REVENUE_GROUPS[name][0])
+            fields += REVENUE_GROUPS[name][1]
+        results = (
+            queryset.annotate(**annotations)
+            .values(*fields)
+            .annotate(**totals)
+            .order_by(*fields)
+        )
+
+        return Response(
+            {"totals": queryset.aggregate(**totals), "results": list(results)},
+            status=status.HTTP_200_OK,
+        )
@@ -17,7 +17,7 @@ from rest_framework import (
     generics,
     status,
 )
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from qms_api.authentication import CachedJWTAuthentication
 
 from qms_api.pagination import StandardResultsSetPagination
 
@@ -34,7 +34,7 @@ from qms_api.custom_permissions import HasPermissionOrInGroupWithPermission
 
 class ServiceCreateView(generics.CreateAPIView):
     serializer_class = ServiceSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "service.add_service"
 
@@ -69,7 +69,7 @@ class ServiceCreateView(generics.CreateAPIView):
 class ServiceListView(generics.ListAPIView):
     queryset = Service.objects.filter(is_deleted=False)
     serializer_class = ServiceSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_codename = "service.view_service"
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     pagination_class = StandardResultsSetPagination
@@ -81,7 +81,7 @@ class ServiceListView(generics.ListAPIView):
 class DeletedServiceListView(generics.ListAPIView):
     queryset = Service.objects.filter(is_deleted=True)
     serializer_class = ServiceSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "service.view_service"
     pagination_class = StandardResultsSetPagination
@@ -92,7 +92,7 @@ class DeletedServiceListView(generics.ListAPIView):
 
 class ServiceRetrieveView(generics.RetrieveAPIView):
     serializer_class = ServiceSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "service.change_service"
     lookup_field = "id"
@@ -106,7 +106,7 @@ class ServiceRetrieveView(generics.RetrieveAPIView):
 class ActiveServiceListView(generics.ListAPIView):
     queryset = Service.objects.filter(is_deleted=False, is_active=True)
     serializer_class = ServiceSerializer
-    # authentication_classes = [JWTAuthentication]
+    # authentication_classes = [CachedJWTAuthentication]
     # permission_classes = [IsAuthenticated]
     pagination_class = StandardResultsSetPagination
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
@@ -116,7 +116,7 @@ class ActiveServiceListView(generics.ListAPIView):
 
 class ServiceChangeActiveView(generics.UpdateAPIView):
     serializer_class = ServiceActiveSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "service.change_service"
 
@@ -147,7 +147,7 @@ class ServiceChangeActiveView(generics.UpdateAPIView):
 
 class ServiceUpdateView(generics.RetrieveUpdateAPIView):
     serializer_class = ServiceSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "service.change_service"
 
@@ -175,7 +175,7 @@ class ServiceUpdateView(generics.RetrieveUpdateAPIView):
 
 class ServiceDeleteTemporaryView(generics.UpdateAPIView):
     serializer_class = ServiceDeleteSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "service.change_service"
 
@@ -222,7 +222,7 @@ class ServiceDeleteTemporaryView(generics.UpdateAPIView):
 class ServiceRestoreView(generics.RetrieveUpdateAPIView):
 
     serializer_class = ServiceDeleteSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "service.change_service"
 
@@ -261,7 +261,7 @@ class ServiceRestoreView(generics.RetrieveUpdateAPIView):
 
 
 class ServiceDeleteView(generics.DestroyAPIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "service.delete_service"
 
@@ -281,7 +281,7 @@ class ServiceDeleteView(generics.DestroyAPIView):
 class ServiceDialogView(generics.ListAPIView):
     serializer_class = ServiceDialogSerializer
     queryset = Service.objects.filter(is_deleted=False, is_active=True)
-    # authentication_classes = [JWTAuthentication]
+    # authentication_classes = [CachedJWTAuthentication]
     # permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     # permission_codename = "service.view_service"
 
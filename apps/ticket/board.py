@@ -0,0 +1,231 @@
+import json
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.core.cache import caches, DEFAULT_CACHE_ALIAS
+from django.utils.functional import cached_property
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from apps.outbox.dispatcher import register_batch_handler
+from apps.outbox.models import OutboxEvent
+
+
+BOARD_GROUP = "tickets_in_progress"
+# Scopes a screen may subscribe to instead of the whole board
+BOARD_SCOPE_KINDS = ("department", "counter")
+
+
+def board_scopes(ticket):
+    """The department and counter scopes showing ``ticket`` on their boards."""
+    scopes = [f"department_{ticket.service.department_id}"]
+    if ticket.counter_id:
+        scopes.append(f"counter_{ticket.counter_id}")
+    return scopes
+
+
+def board_group(scope=None):
+    """Channel layer group of the board of ``scope``, or of the whole board."""
+    return f"{BOARD_GROUP}_{scope}" if scope else BOARD_GROUP
+
+
+def board_entry(ticket):
+    """Representation of an in-progress ticket on the display board."""
+    ticket_number_parts = ticket.number.split("-")
+    return {
+        "id": str(ticket.id),
+        "ticket_number": f"{ticket_number_parts[0]}-{ticket_number_parts[-1]}",
+        "counter": ticket.counter.number if ticket.counter else None,
+        "status": ticket.status,
+    }
+
+
+class BoardLockTimeout(Exception):
+    """The board lock is held by another worker for too long."""
+
+
+class BoardSnapshotStore:
+    """
+    Tickets currently shown on the display boards, kept in the shared cache
+    so every worker process serves the same snapshots.
+
+    There is one snapshot for the whole board and one per department and
+    counter scope. Each is a document holding the tickets keyed by id and a
+    ``seq`` that every applied batch of changes to it bumps, so screens can
+    tell whether they missed a delta and need a fresh snapshot. The whole
+    board also records the scopes of each ticket, so a change reaches the
+    scopes the ticket leaves as well as those it enters.
+    """
+
+    key_prefix = "ticket_board:snapshot"
+    lock_key = "ticket_board:lock"
+    lock_timeout = 5
+
+    @cached_property
+    def cache(self):
+        # One client for all threads and async contexts; django.core.cache
+        # would open a connection per websocket connection reading the board
+        return caches.create_connection(DEFAULT_CACHE_ALIAS)
+
+    def _key(self, scope):
+        return f"{self.key_prefix}:{scope or 'all'}"
+
+    def _build(self, scope):
+        from apps.ticket.models import Ticket
+
+        tickets = Ticket.objects.filter(status="in_progress").select_related(
+            "counter", "service"
+        )
+        if scope:
+            kind, scope_id = scope.split("_", 1)
+            if kind == "department":
+                tickets = tickets.filter(service__department_id=scope_id)
+            else:
+                tickets = tickets.filter(counter_id=scope_id)
+
+        document = {"seq": 0, "tickets": {}}
+        if not scope:
+            document["scopes"] = {}
+        for ticket in tickets:
+            document["tickets"][str(ticket.id)] = board_entry(ticket)
+            if not scope:
+                document["scopes"][str(ticket.id)] = board_scopes(ticket)
+        return document
+
+    def _get(self, scope=None):
+        document = self.cache.get(self._key(scope))
+        if document is None:
+            # Cold cache: seed the board from the database once, without
+            # overwriting a document another worker stored meanwhile
+            document = self._build(scope)
+            if not self.cache.add(self._key(scope), document, timeout=None):
+                document = self.cache.get(self._key(scope), document)
+        return document
+
+    @contextmanager
+    def locked(self):
+        """
+        Serialize updates of the snapshots across worker processes. Raises
+        ``BoardLockTimeout`` when the lock cannot be taken within
+        ``lock_timeout`` seconds, so the changes are retried later rather
+        than applied unlocked.
+        """
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_timeout
+        while not self.cache.add(self.lock_key, token, timeout=self.lock_timeout):
+            if time.monotonic() > deadline:
+                raise BoardLockTimeout("Timed out waiting for the board lock")
+            time.sleep(0.01)
+        try:
+            yield
+        finally:
+            if self.cache.get(self.lock_key) == token:
+                self.cache.delete(self.lock_key)
+
+    @staticmethod
+    def _apply(document, changes):
+        tickets = document["tickets"]
+        events = []
+        for ticket_id, entry in changes.items():
+            current = tickets.get(ticket_id)
+            if entry is None:
+                if current is None:
+                    continue
+                del tickets[ticket_id]
+                events.append({"op": "remove", "id": ticket_id})
+            elif current != entry:
+                tickets[ticket_id] = entry
+                events.append({"op": "update" if current else "add", "ticket": entry})
+        if events:
+            document["seq"] += 1
+        return events
+
+    def apply(self, changes):
+        """
+        Apply ``{ticket_id: (entry, scopes) or None}`` changes and return
+        ``{scope: (seq, events)}`` for the boards they actually changed, the
+        whole board under ``None``. Must be called while holding ``locked()``.
+        """
+        board = self._get()
+        scope_changes = {}
+        for ticket_id, change in changes.items():
+            entry, scopes = change or (None, [])
+            for scope in set(board["scopes"].get(ticket_id, ())) | set(scopes):
+                scope_changes.setdefault(scope, {})[ticket_id] = (
+                    entry if scope in scopes else None
+                )
+            if entry is None:
+                board["scopes"].pop(ticket_id, None)
+            else:
+                board["scopes"][ticket_id] = scopes
+
+        updated = {}
+        documents = {self._key(None): board}
+        entries = {key: change and change[0] for key, change in changes.items()}
+        events = self._apply(board, entries)
+        if events:
+            updated[None] = (board["seq"], events)
+
+        for scope, scope_change in scope_changes.items():
+            document = self._get(scope)
+            events = self._apply(document, scope_change)
+            if events:
+                updated[scope] = (document["seq"], events)
+                documents[self._key(scope)] = document
+        self.cache.set_many(documents, timeout=None)
+        return updated
+
+    def snapshot(self, scope=None):
+        """The tickets on the board of ``scope``, or on the whole board."""
+        document = self._get(scope)
+        return {"seq": document["seq"], "tickets": list(document["tickets"].values())}
+
+
+def queue_board_change(ticket, on_board):
+    """
+    Record in the outbox that ``ticket`` was added to, updated on or removed
+    from the board; call inside the transaction that saves the ticket.
+    """
+    OutboxEvent.publish(
+        BOARD_GROUP,
+        {
+            "type": "board_change",
+            "id": str(ticket.id),
+            "ticket": board_entry(ticket) if on_board else None,
+            "scopes": board_scopes(ticket) if on_board else [],
+        },
+    )
+
+
+def publish_board_changes(messages):
+    """
+    Outbox batch handler: apply the board changes of one dispatcher batch and
+    send each board they affect a single delta, so screens only hear about
+    their own department or counter.
+    """
+    # Later changes of the same ticket within the batch replace earlier ones
+    changes = {
+        message["id"]: (
+            (message["ticket"], message.get("scopes", []))
+            if message["ticket"]
+            else None
+        )
+        for message in messages
+    }
+
+    # Send while holding the store lock so deltas from all dispatchers leave
+    # in sequence order
+    channel_layer = get_channel_layer()
+    with board_store.locked():
+        for scope, (seq, events) in board_store.apply(changes).items():
+            # Encoded once here rather than by every connected screen
+            text = json.dumps({"type": "update_tickets", "seq": seq, "events": events})
+            async_to_sync(channel_layer.group_send)(
+                board_group(scope), {"type": "send_ticket_update", "text": text}
+            )
+
+
+board_store = BoardSnapshotStore()
+register_batch_handler("board_change", publish_board_changes)
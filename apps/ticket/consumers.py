@@ -1,15 +1,70 @@
 # your_app/consumers.py
+import asyncio
 import json
-from channels.generic.websocket import AsyncWebsocketConsumer
-
-import json
+import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
 from asgiref.sync import sync_to_async
 
-from apps.ticket.models import in_progress_tickets
+from apps.ticket.board import board_group, board_store
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueuedSendConsumer(AsyncWebsocketConsumer):
+    """
+    Websocket consumer that sends through a bounded per-connection queue,
+    drained by its own task, so a slow screen never holds up the handling
+    of group messages.
+
+    Frames are text already encoded by the publisher, or coroutine functions
+    returning the text when it is their turn. When the queue is full the
+    pending frames are dropped for ``latest_frame`` (by default the newest
+    one), so a screen that fell behind skips straight to the latest state.
+    """
+
+    send_queue_size = 32
+
+    async def websocket_connect(self, message):
+        self._frames = asyncio.Queue(maxsize=self.send_queue_size)
+        self._writer = asyncio.create_task(self._write_frames())
+        await super().websocket_connect(message)
+
+    async def websocket_disconnect(self, message):
+        self._writer.cancel()
+        await super().websocket_disconnect(message)
 
+    async def _write_frames(self):
+        while True:
+            frame = await self._frames.get()
+            try:
+                if callable(frame):
+                    frame = await frame()
+                await self.send(text_data=frame)
+            except Exception:
+                # Nothing is sent on this connection any more; close it so
+                # the screen reconnects instead of waiting on a silent socket
+                logger.exception("Sending to a websocket failed, closing it")
+                try:
+                    await self.close()
+                except Exception:
+                    pass
+                return
 
-class TicketConsumer(AsyncWebsocketConsumer):
+    def latest_frame(self, frame):
+        """The frame that replaces the queued ones on overflow."""
+        return frame
+
+    def queue_frame(self, frame):
+        try:
+            self._frames.put_nowait(frame)
+        except asyncio.QueueFull:
+            while not self._frames.empty():
+                self._frames.get_nowait()
+            self._frames.put_nowait(self.latest_frame(frame))
+
+
+class TicketConsumer(QueuedSendConsumer):
     async def connect(self):
         # Extract the ticket UUID from the WebSocket URL
         self.ticket_id = self.scope["url_route"]["kwargs"]["ticket_id"]
@@ -24,44 +79,59 @@ class TicketConsumer(AsyncWebsocketConsumer):
         await self.channel_layer.group_discard(self.group_name, self.channel_name)
 
     async def ticket_notification(self, event):
-        # Send the notification to the client
-        await self.send(text_data=json.dumps(event["data"]))
+        # Forward the notification, encoded once by the publisher
+        self.queue_frame(event["text"])
+
+    async def queue_position(self, event):
+        """Forward the new position and estimated wait of the ticket."""
+        self.queue_frame(event["text"])
+
 
-class TicketInProgressConsumer(AsyncWebsocketConsumer):
+class TicketInProgressConsumer(QueuedSendConsumer):
     async def connect(self):
-        self.group_name = "tickets_in_progress"
+        # The whole board, or only the tickets of one department or counter
+        kwargs = self.scope.get("url_route", {}).get("kwargs", {})
+        self.board_scope = (
+            f"{kwargs['scope']}_{kwargs['scope_id']}" if "scope" in kwargs else None
+        )
+        self.group_name = board_group(self.board_scope)
 
         # Join the group
         await self.channel_layer.group_add(self.group_name, self.channel_name)
         await self.accept()
 
         # Send all tickets in "in_progress" status to the client on connection
-        await self.send_initial_tickets()
-
-        print("Client connected to TicketInProgressConsumer")
+        self.queue_frame(self.initial_tickets)
 
     async def disconnect(self, close_code):
         # Leave the group
         await self.channel_layer.group_discard(self.group_name, self.channel_name)
-        print("Client disconnected from TicketInProgressConsumer")
+
+    async def receive(self, text_data=None, bytes_data=None):
+        """A screen that noticed a gap in ``seq`` asks for a fresh snapshot."""
+        try:
+            message = json.loads(text_data or "{}")
+        except ValueError:
+            return
+        if isinstance(message, dict) and message.get("type") == "resync":
+            self.queue_frame(self.initial_tickets)
+
+    def latest_frame(self, frame):
+        # Deltas only make sense in sequence, so a screen that fell behind
+        # gets the whole board instead
+        return self.initial_tickets
 
     async def send_ticket_update(self, event):
-        """Handles incoming events from the group send."""
-        # Send ticket update to WebSocket
-        print("Received ticket update:", event)
-        await self.send(text_data=json.dumps({"type": "update_tickets", "tickets": event["message"]}))
-
-    async def send_initial_tickets(self):
-        """Send all tickets in the 'in_progress' status when a client connects."""
-        # Prepare ticket data from the in-progress tickets list
-        ticket_data = in_progress_tickets.get("tickets_in_progress", [])
-
-        # Send the ticket data to the WebSocket client
-        await self.send(
-            text_data=json.dumps(
-                {
-                    "type": "initial_tickets",
-                    "tickets": ticket_data,
-                }
-            )
+        """Forward a board delta (add/update/remove events) to the screen."""
+        self.queue_frame(event["text"])
+
+    async def initial_tickets(self):
+        """The whole board together with its current sequence number."""
+        snapshot = await sync_to_async(board_store.snapshot)(self.board_scope)
+        return json.dumps(
+            {
+                "type": "initial_tickets",
+                "seq": snapshot["seq"],
+                "tickets": snapshot["tickets"],
+            }
         )
@@ -0,0 +1,60 @@
+from functools import partial
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.counter.models import counter_services
+from apps.ticket.models import Ticket
+
+
+def call_next_customer(counter, user):
+    """
+    Claim the oldest ticket of today that the counter may serve and complete
+    the ticket the counter is currently serving, in a single transaction.
+
+    The claim is one ``SELECT ... FOR UPDATE SKIP LOCKED`` over the services
+    of the counter (taken from the counter services cache), so counters
+    calling at the same time never get the same ticket and never wait on
+    each other's row locks. The wait statistics of the service, a row every
+    counter serving it writes to, are updated once the claim has committed.
+    Returns the claimed ticket, or ``None`` when the queue is empty.
+    """
+    service_ids = counter_services.get(counter.id)
+    if not service_ids:
+        return None
+
+    now = timezone.now()
+    with transaction.atomic():
+        next_ticket = (
+            Ticket.objects.select_for_update(skip_locked=True, of=("self",))
+            # The service is needed for the department board of the ticket
+            .select_related("service")
+            .filter(
+                service_id__in=service_ids,
+                called_at__isnull=True,
+                created_at__gte=Ticket.queue_day_start(now),
+            )
+            .order_by("created_at")
+            .first()
+        )
+        if next_ticket is None:
+            return None
+
+        current_tickets = Ticket.objects.select_for_update().filter(
+            counter=counter, status="in_progress"
+        )
+        for current_ticket in current_tickets:
+            current_ticket.status = "completed"
+            current_ticket.save(update_fields=["status"])
+            transaction.on_commit(partial(current_ticket.record_completed, now))
+
+        next_ticket.called_at = now
+        next_ticket.status = "in_progress"
+        next_ticket.served_by = user
+        next_ticket.counter = counter
+        next_ticket.save(
+            update_fields=["called_at", "status", "served_by", "counter"]
+        )
+        transaction.on_commit(next_ticket.record_called)
+
+    return next_ticket
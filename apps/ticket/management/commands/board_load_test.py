@@ -0,0 +1,111 @@
+import asyncio
+import json
+import time
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+from channels.layers import InMemoryChannelLayer, channel_layers, DEFAULT_CHANNEL_LAYER
+from channels.testing import WebsocketCommunicator
+
+from apps.ticket.board import BOARD_GROUP, board_store
+from apps.ticket.consumers import TicketInProgressConsumer
+
+
+class LoadTestChannelLayer(InMemoryChannelLayer):
+    """
+    In-memory layer sweeping expired messages once a second rather than on
+    every receive, which would otherwise dominate the run with many screens.
+    """
+
+    _last_clean = 0
+
+    def _clean_expired(self):
+        now = time.monotonic()
+        if now - self._last_clean >= 1:
+            self._last_clean = now
+            super()._clean_expired()
+
+
+class Command(BaseCommand):
+    help = (
+        "Connect many display screens to the board consumer over an in-memory "
+        "channel layer and measure how many messages per second reach them. "
+        "The board snapshots are served from an empty in-process board, so "
+        "neither Redis nor the database is used."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--screens", type=int, default=1000)
+        parser.add_argument("--messages", type=int, default=100)
+
+    def handle(self, *args, **options):
+        screens = options["screens"]
+        messages = options["messages"]
+
+        layer = LoadTestChannelLayer(capacity=messages + 10)
+        previous = channel_layers.set(DEFAULT_CHANNEL_LAYER, layer)
+        # An empty board in a local cache: the snapshot sent on connect then
+        # needs neither the shared cache nor a build from the database
+        board_cache = LocMemCache("board_load_test", {})
+        board_cache.set(
+            board_store._key(None),
+            {"seq": 0, "tickets": {}, "scopes": {}},
+            timeout=None,
+        )
+        previous_board_cache = board_store.__dict__.get("cache")
+        board_store.cache = board_cache
+        try:
+            delivered, elapsed = asyncio.run(self.run(screens, messages))
+        finally:
+            channel_layers.set(DEFAULT_CHANNEL_LAYER, previous)
+            if previous_board_cache is None:
+                del board_store.cache
+            else:
+                board_store.cache = previous_board_cache
+
+        self.stdout.write(
+            f"{delivered} of {screens * messages} messages to {screens} screens "
+            f"in {elapsed:.2f}s: {delivered / elapsed:.0f} messages/s"
+        )
+
+    async def run(self, screens, messages):
+        application = TicketInProgressConsumer.as_asgi()
+        communicators = []
+        for _ in range(screens):
+            communicator = WebsocketCommunicator(application, "/ws/tickets/in_progress/")
+            await communicator.connect()
+            await communicator.receive_from()  # initial snapshot
+            communicators.append(communicator)
+
+        async def receive(communicator):
+            # Until the last delta, or a snapshot that replaced dropped ones.
+            # Frames are read off the output queue directly, receive_from
+            # costs more than the consumer itself
+            count = 0
+            while True:
+                message = await communicator.output_queue.get()
+                frame = json.loads(message["text"])
+                count += 1
+                if frame["type"] == "initial_tickets" or frame["seq"] == messages:
+                    return count
+
+        receivers = [asyncio.create_task(receive(c)) for c in communicators]
+        started = time.perf_counter()
+        for seq in range(1, messages + 1):
+            # Encoded once per message, as publish_board_changes does
+            text = json.dumps(
+                {
+                    "type": "update_tickets",
+                    "seq": seq,
+                    "events": [{"op": "remove", "id": str(seq)}],
+                }
+            )
+            await channel_layers[DEFAULT_CHANNEL_LAYER].group_send(
+                BOARD_GROUP, {"type": "send_ticket_update", "text": text}
+            )
+        delivered = sum(await asyncio.gather(*receivers))
+        elapsed = time.perf_counter() - started
+
+        for communicator in communicators:
+            await communicator.disconnect()
+        return delivered, elapsed
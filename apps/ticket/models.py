@@ -1,7 +1,10 @@
+import json
+import re
 import uuid
 
-from django.db import models
-from django.db.models import Avg, F, ExpressionWrapper, fields
+from django.db import models, connection, transaction
+from django.db.models import Avg, F, ExpressionWrapper, Max, Q, fields
+from django.db.models.functions import Cast, Substr, TruncDate
 from django.conf import settings
 from django.core.validators import RegexValidator
 from django.dispatch import receiver
@@ -13,15 +16,184 @@ from django.utils.translation import gettext_lazy as _
 from apps.counter.models import Counter
 from apps.service.models import Service
 
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
+from collections import defaultdict
+from bisect import bisect_left
 
-from channels.layers import get_channel_layer
+from apps.outbox.models import OutboxEvent
+from apps.ticket.board import queue_board_change
+from apps.ticket.positions import queue_moved
 
-from collections import defaultdict
 
+class TicketSequence(models.Model):
+    """
+    Per-service daily counter used to hand out ticket numbers.
+    """
 
-channel_layer = get_channel_layer()
+    service = models.ForeignKey(Service, on_delete=models.CASCADE)
+    date = models.DateField()
+    last_number = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["service", "date"], name="unique_ticket_sequence_per_day"
+            )
+        ]
+
+    @classmethod
+    def next_number(cls, service, date=None):
+        """
+        Atomically allocate the next number for the service on the given date.
+        The increment happens under the row lock, so concurrent callers never
+        receive the same number. The day's row is created by an upsert that
+        continues after the tickets already numbered that day.
+        """
+        date = date or timezone.now().date()
+        table = connection.ops.quote_name(cls._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {table} SET last_number = last_number + 1
+                WHERE service_id = %s AND date = %s
+                RETURNING last_number
+                """,
+                [service.pk, date],
+            )
+            row = cursor.fetchone()
+            if row is None:
+                # First number of the day: continue after the tickets numbered
+                # before the sequence row existed
+                last_number = cls.last_existing_number(service, date)
+                cursor.execute(
+                    f"""
+                    INSERT INTO {table} (service_id, date, last_number)
+                    VALUES (%s, %s, %s)
+                    ON CONFLICT (service_id, date)
+                    DO UPDATE SET last_number = {table}.last_number + 1
+                    RETURNING last_number
+                    """,
+                    [service.pk, date, last_number + 1],
+                )
+                row = cursor.fetchone()
+        return row[0]
+
+    @staticmethod
+    def last_existing_number(service, date):
+        """
+        Highest number of the service's tickets of ``date`` numbered without
+        a sequence row, in either format in use: ``A-7`` (TicketCreateView)
+        and ``A-20240101-7`` (Ticket.save).
+        """
+        symbol = service.service_symbol
+        dated_prefix = f"{symbol}-{date.strftime('%Y%m%d')}-"
+        formats = [
+            (
+                Q(number__regex=rf"^{re.escape(symbol)}-[0-9]+$")
+                & Q(created_at__date=date),
+                len(symbol) + 1,
+            ),
+            (
+                Q(number__regex=rf"^{re.escape(dated_prefix)}[0-9]+$"),
+                len(dated_prefix),
+            ),
+        ]
+        last_number = 0
+        for condition, prefix_length in formats:
+            last = (
+                Ticket.objects.filter(condition, service=service)
+                .annotate(
+                    sequence_number=Cast(
+                        Substr("number", prefix_length + 1), models.IntegerField()
+                    )
+                )
+                .aggregate(last=Max("sequence_number"))["last"]
+            )
+            last_number = max(last_number, last or 0)
+        return last_number
+
+
+class ServiceWaitStats(models.Model):
+    """
+    Running wait and service time statistics of a service for one day.
+
+    ``wait`` is the time from ticket creation until it is called and
+    ``service`` the time from being called until completion. Both keep a
+    count, sum, sum of squares and an exponentially weighted moving average
+    so that readers get the mean, deviation and recent trend in O(1).
+    """
+
+    EWMA_ALPHA = 0.2
+
+    service = models.ForeignKey(Service, on_delete=models.CASCADE)
+    date = models.DateField()
+    wait_count = models.PositiveIntegerField(default=0)
+    wait_total = models.FloatField(default=0)
+    wait_total_sq = models.FloatField(default=0)
+    wait_ewma = models.FloatField(default=0)
+    service_count = models.PositiveIntegerField(default=0)
+    service_total = models.FloatField(default=0)
+    service_total_sq = models.FloatField(default=0)
+    service_ewma = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["service", "date"], name="unique_service_wait_stats_per_day"
+            )
+        ]
+
+    @classmethod
+    def record_wait(cls, service_id, date, seconds):
+        cls._record("wait", service_id, date, seconds)
+
+    @classmethod
+    def record_service_time(cls, service_id, date, seconds):
+        cls._record("service", service_id, date, seconds)
+
+    @classmethod
+    def _record(cls, metric, service_id, date, seconds):
+        """Fold one sample into the day's row with a single upsert."""
+        table = connection.ops.quote_name(cls._meta.db_table)
+        seconds = max(seconds, 0)
+        sample = {"wait": [0, 0, 0, 0], "service": [0, 0, 0, 0]}
+        sample[metric] = [1, seconds, seconds * seconds, seconds]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (
+                    service_id, date,
+                    wait_count, wait_total, wait_total_sq, wait_ewma,
+                    service_count, service_total, service_total_sq, service_ewma
+                )
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (service_id, date) DO UPDATE SET
+                    {metric}_count = {table}.{metric}_count + 1,
+                    {metric}_total = {table}.{metric}_total + EXCLUDED.{metric}_total,
+                    {metric}_total_sq = {table}.{metric}_total_sq
+                        + EXCLUDED.{metric}_total_sq,
+                    {metric}_ewma = CASE
+                        WHEN {table}.{metric}_count = 0 THEN EXCLUDED.{metric}_ewma
+                        ELSE {table}.{metric}_ewma
+                            + %s * (EXCLUDED.{metric}_ewma - {table}.{metric}_ewma)
+                    END
+                """,
+                [service_id, date, *sample["wait"], *sample["service"], cls.EWMA_ALPHA],
+            )
+
+    @property
+    def wait_mean(self):
+        return self.wait_total / self.wait_count if self.wait_count else 0
+
+    @property
+    def wait_stddev(self):
+        if not self.wait_count:
+            return 0
+        variance = self.wait_total_sq / self.wait_count - self.wait_mean**2
+        return max(variance, 0) ** 0.5
+
+    @property
+    def service_mean(self):
+        return self.service_total / self.service_count if self.service_count else 0
 
 
 class Ticket(models.Model):
@@ -66,6 +238,28 @@ class Ticket(models.Model):
     )
     email = models.EmailField(max_length=255)
 
+    _loaded_status = None
+
+    class Meta:
+        indexes = [
+            # Waiting list of a service in queue order (positions and dispatch)
+            models.Index(
+                fields=["service", "created_at"],
+                condition=Q(called_at__isnull=True),
+                name="ticket_waiting_idx",
+            ),
+            # Tickets currently being served at a counter
+            models.Index(
+                fields=["counter"],
+                condition=Q(status="in_progress"),
+                name="ticket_in_progress_idx",
+            ),
+            # created_at__date lookups ("today's tickets")
+            models.Index(TruncDate("created_at"), name="ticket_created_date_idx"),
+            # Newest-first listing and its keyset pages
+            models.Index(fields=["-created_at", "-id"], name="ticket_created_at_idx"),
+        ]
+
     def __str__(self):
         return f"Ticket {self.number} - {self.service.name}"
 
@@ -74,114 +268,186 @@ class Ticket(models.Model):
         """
         Calculate the number of customers ahead of the current ticket
         """
-        tickets_ahead = Ticket.objects.filter(
-            service=self.service,
-            created_at__lt=self.created_at,
-            called_at__isnull=True,  # Exclude tickets that have been called
-        ).count()
-        return tickets_ahead
+        if not hasattr(self, "_customers_ahead"):
+            Ticket.prime_customers_ahead([self])
+        return self._customers_ahead
+
+    @staticmethod
+    def queue_day_start(moment):
+        """Start of the queue day the given moment belongs to."""
+        return timezone.localtime(moment).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+
+    @classmethod
+    def prime_customers_ahead(cls, tickets):
+        """
+        Resolve ``customers_ahead`` for a batch of tickets with a single query.
+
+        The waiting list of a service is its uncalled tickets of the day in
+        creation order. It is read once for every service in the batch and each
+        ticket's position is found by bisecting it, then cached on the instance.
+        Calling a ticket sets ``called_at``, which drops it from the list.
+        """
+        tickets = [
+            ticket for ticket in tickets if not hasattr(ticket, "_customers_ahead")
+        ]
+        if not tickets:
+            return
+
+        day_starts = {
+            ticket.pk: cls.queue_day_start(ticket.created_at) for ticket in tickets
+        }
+        waiting_lists = defaultdict(list)
+        waiting_tickets = (
+            cls.objects.filter(
+                service_id__in={ticket.service_id for ticket in tickets},
+                called_at__isnull=True,
+                created_at__gte=min(day_starts.values()),
+                created_at__lt=max(ticket.created_at for ticket in tickets),
+            )
+            .order_by("service_id", "created_at")
+            .values_list("service_id", "created_at")
+        )
+        for service_id, created_at in waiting_tickets:
+            waiting_lists[service_id].append(created_at)
+
+        for ticket in tickets:
+            waiting_list = waiting_lists[ticket.service_id]
+            ticket._customers_ahead = bisect_left(
+                waiting_list, ticket.created_at
+            ) - bisect_left(waiting_list, day_starts[ticket.pk])
 
     @property
     def avg_wait_time(self):
         """
-        Calculate the average wait time for the current ticket
+        Average wait time in seconds of the ticket's service on its day
         """
-        # Filter tickets for the same service that have been called
-        previous_tickets = Ticket.objects.filter(
-            service=self.service,
-            called_at__isnull=False,
-            created_at__lt=self.created_at,
-        )
+        if not hasattr(self, "_wait_stats"):
+            Ticket.prime_wait_stats([self])
+        return self._wait_stats.wait_mean if self._wait_stats else 0
 
-        # Initialize total wait time and number of previous tickets
-        total_wait_time = timezone.timedelta(0)
-        num_previous_tickets = 0
-
-        # Iterate through previous tickets to calculate total wait time
-        for ticket in previous_tickets:
-            # Calculate wait time only for tickets that are not in progress or waiting
-            if ticket.status == "completed":
-                wait_time = ticket.called_at - ticket.created_at
-                total_wait_time += wait_time
-                num_previous_tickets += 1
-
-        # Calculate the average wait time
-        if num_previous_tickets > 0:
-            average_wait_time = total_wait_time / num_previous_tickets
-            return (
-                average_wait_time.total_seconds()
-            )  # Return average wait time in seconds
-        else:
+    @property
+    def estimated_wait_time(self):
+        """
+        Estimated seconds until the ticket is called, based on the customers
+        ahead and the recent service time of its service
+        """
+        if self.called_at:
             return 0
+        if not hasattr(self, "_wait_stats"):
+            Ticket.prime_wait_stats([self])
+        service_time = self._wait_stats.service_ewma if self._wait_stats else 0
+        return self.customers_ahead * service_time
+
+    @property
+    def queue_date(self):
+        return self.queue_day_start(self.created_at).date()
+
+    @classmethod
+    def prime_wait_stats(cls, tickets):
+        """Load the day's wait statistics for a batch of tickets in one query."""
+        tickets = [ticket for ticket in tickets if not hasattr(ticket, "_wait_stats")]
+        if not tickets:
+            return
+
+        keys = {(ticket.service_id, ticket.queue_date) for ticket in tickets}
+        stats = {
+            (row.service_id, row.date): row
+            for row in ServiceWaitStats.objects.filter(
+                service_id__in={service_id for service_id, _ in keys},
+                date__in={date for _, date in keys},
+            )
+        }
+        for ticket in tickets:
+            ticket._wait_stats = stats.get((ticket.service_id, ticket.queue_date))
+
+    @classmethod
+    def prime_queue_info(cls, tickets):
+        """Batch-load everything the queue fields of a ticket page need."""
+        cls.prime_customers_ahead(tickets)
+        cls.prime_wait_stats(tickets)
+
+    def record_called(self):
+        """Fold the time this ticket waited into its service's statistics."""
+        ServiceWaitStats.record_wait(
+            self.service_id,
+            self.queue_date,
+            (self.called_at - self.created_at).total_seconds(),
+        )
+
+    def record_completed(self, completed_at=None):
+        """Fold the time this ticket was served into its service's statistics."""
+        if self.called_at:
+            completed_at = completed_at or timezone.now()
+            ServiceWaitStats.record_service_time(
+                self.service_id,
+                self.queue_date,
+                (completed_at - self.called_at).total_seconds(),
+            )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status so post_save can tell when a ticket
+        # leaves the display board
+        instance._loaded_status = instance.__dict__.get("status")
+        return instance
 
     def save(self, *args, **kwargs):
         # Generate ticket number with service symbol prefix and current date
         if not self.number:
             today_date = timezone.now().date()
-            ticket_count_today = (
-                Ticket.objects.filter(created_at__date=today_date).count() + 1
-            )
-            self.number = f"{self.service.service_symbol}-{today_date.strftime('%Y%m%d')}-{ticket_count_today}"
-        super().save(*args, **kwargs)
-
+            sequential_number = TicketSequence.next_number(self.service, today_date)
+            self.number = f"{self.service.service_symbol}-{today_date.strftime('%Y%m%d')}-{sequential_number}"
+        # post_save queues the ticket's notifications in the outbox, which has
+        # to happen in the same transaction as the save itself
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
 
 
-in_progress_tickets = defaultdict(list)
 
 @receiver(post_save, sender=Ticket)
 def ticket_status_updated(sender, instance, **kwargs):
-    # Fetch all current in-progress tickets
-    all_in_progress_tickets = [
-        {
-            "ticket_number": t.number.split("-")[0] + "-" + t.number.split("-")[-1],
-            "counter": t.counter.number if t.counter else None,
-            "status": t.status,
-        }
-        for t in Ticket.objects.filter(status="in_progress")
-    ]
-
     if instance.status == "in_progress":
-        channel_layer = get_channel_layer()
-
         # Extract the first and last parts of the ticket number
         ticket_number_parts = instance.number.split("-")
         shortened_ticket_number = f"{ticket_number_parts[0]}-{ticket_number_parts[-1]}"
 
-        # Send a message to the specific ticket's group (for TicketConsumer)
-        async_to_sync(channel_layer.group_send)(
+        # Queue a message to the specific ticket's group (for TicketConsumer)
+        OutboxEvent.publish(
             f"ticket_{instance.id}",  # Use the ticket UUID as the group name
             {
                 "type": "ticket_notification",
-                "data": {
-                    "ticket_number": shortened_ticket_number,
-                    "counter": instance.counter.number if instance.counter else None,
-                    "message": f"Your ticket {shortened_ticket_number} is now being served.",
-                },
+                # Encoded once here rather than by every connected client
+                "text": json.dumps(
+                    {
+                        "ticket_number": shortened_ticket_number,
+                        "counter": (
+                            instance.counter.number if instance.counter else None
+                        ),
+                        "message": f"Your ticket {shortened_ticket_number} is now being served.",
+                    }
+                ),
             },
         )
 
-        # Remove duplicate entries based on the ticket number and counter
-        unique_in_progress_tickets = {
-            (ticket["counter"], ticket["ticket_number"]): ticket
-            for ticket in all_in_progress_tickets
-        }
+        # Only this ticket changed, so publish it as a delta for the board
+        queue_board_change(instance, on_board=True)
 
-        # Add new ticket if not already present
-        unique_in_progress_tickets[(instance.counter.number, shortened_ticket_number)] = {
-            "ticket_number": shortened_ticket_number,
-            "counter": instance.counter.number,
-            "status": instance.status,
-        }
+        if instance._loaded_status != "in_progress":
+            # The ticket left the waiting list: everyone behind it moved up
+            queue_moved(instance.service_id)
+    elif instance._loaded_status == "in_progress":
+        queue_board_change(instance, on_board=False)
 
-        # Convert back to a list
-        in_progress_tickets["tickets_in_progress"] = list(unique_in_progress_tickets.values())
+    instance._loaded_status = instance.status
 
-        # Send the updated tickets to the group
-        async_to_sync(channel_layer.group_send)(
-            "tickets_in_progress",  # Group for all tickets in "in_progress"
-            {
-                "type": "send_ticket_update",
-                "message": in_progress_tickets["tickets_in_progress"],  # Send full list
-            },
-        )
+
+@receiver(post_delete, sender=Ticket)
+def ticket_deleted(sender, instance, **kwargs):
+    if instance.status == "in_progress":
+        queue_board_change(instance, on_board=False)
+    elif instance.called_at is None:
+        queue_moved(instance.service_id)
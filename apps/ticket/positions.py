@@ -0,0 +1,98 @@
+import json
+from collections import defaultdict
+
+from django.utils import timezone
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from apps.outbox.dispatcher import register_batch_handler
+from apps.outbox.models import OutboxEvent
+
+
+def queue_moved(service_id):
+    """
+    Record in the outbox that the waiting list of a service moved; call inside
+    the transaction that calls or removes one of its tickets.
+    """
+    OutboxEvent.publish(
+        f"queue_{service_id}", {"type": "queue_moved", "service": str(service_id)}
+    )
+
+
+def queue_positions(service_ids, now=None):
+    """
+    ``{ticket_id: (customers_ahead, avg_wait_time, estimated_wait_time)}`` for
+    every waiting ticket of today of the given services, computed from one
+    query for the waiting lists and one for the wait statistics.
+    """
+    from apps.ticket.models import ServiceWaitStats, Ticket
+
+    day_start = Ticket.queue_day_start(now or timezone.now())
+    waiting_lists = defaultdict(list)
+    for ticket_id, service_id in (
+        Ticket.objects.filter(
+            service_id__in=service_ids,
+            called_at__isnull=True,
+            created_at__gte=day_start,
+        )
+        .order_by("service_id", "created_at")
+        .values_list("id", "service_id")
+    ):
+        waiting_lists[service_id].append(ticket_id)
+
+    stats = {
+        row.service_id: row
+        for row in ServiceWaitStats.objects.filter(
+            service_id__in=waiting_lists.keys(), date=day_start.date()
+        )
+    }
+
+    positions = {}
+    for service_id, waiting_list in waiting_lists.items():
+        service_stats = stats.get(service_id)
+        avg_wait_time = service_stats.wait_mean if service_stats else 0
+        service_time = service_stats.service_ewma if service_stats else 0
+        for customers_ahead, ticket_id in enumerate(waiting_list):
+            positions[ticket_id] = (
+                customers_ahead,
+                avg_wait_time,
+                customers_ahead * service_time,
+            )
+    return positions
+
+
+def publish_queue_positions(messages):
+    """
+    Outbox batch handler: push the new position and estimated wait of every
+    waiting ticket behind the moved queues of one dispatcher batch to the
+    ticket's group, computed once per service for the whole batch.
+    """
+    service_ids = {message["service"] for message in messages}
+    positions = queue_positions(service_ids)
+    if not positions:
+        return
+
+    channel_layer = get_channel_layer()
+
+    async def send_all():
+        for ticket_id, (customers_ahead, avg_wait_time, eta) in positions.items():
+            # Encoded once here rather than by every connected client
+            text = json.dumps(
+                {
+                    "type": "queue_position",
+                    "ticket_id": str(ticket_id),
+                    "customers_ahead": customers_ahead,
+                    "avg_wait_time": avg_wait_time,
+                    "estimated_wait_time": eta,
+                }
+            )
+            await channel_layer.group_send(
+                f"ticket_{ticket_id}", {"type": "queue_position", "text": text}
+            )
+
+    # One event loop round trip for the whole batch, not one per ticket
+    async_to_sync(send_all)()
+
+
+register_batch_handler("queue_moved", publish_queue_positions)
@@ -8,5 +8,10 @@ websocket_urlpatterns = [
     # re_path(r"^tickets/ahead/$", TicketConsumer.as_asgi()),  # No need for 'wss' in the route
     re_path(r'^ws/tickets/(?P<ticket_id>[a-f0-9\-]+)/$', TicketConsumer.as_asgi()),
     re_path(r'ws/tickets/in_progress/$', TicketInProgressConsumer.as_asgi()),
+    # Boards showing a single department or counter
+    re_path(
+        r'ws/tickets/in_progress/(?P<scope>department|counter)/(?P<scope_id>[a-f0-9\-]+)/$',
+        TicketInProgressConsumer.as_asgi(),
+    ),
 
 ]
@@ -1,7 +1,16 @@
+from django.db import models
 from rest_framework import serializers
 from .models import Ticket
 
 
+class TicketListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        """Resolve the queue fields of the whole page in batched lookups."""
+        tickets = list(data.all() if isinstance(data, models.Manager) else data)
+        Ticket.prime_queue_info(tickets)
+        return super().to_representation(tickets)
+
+
 class TicketSerializer(serializers.ModelSerializer):
     service_name = serializers.CharField(source="service.name", read_only=True)
     service_name_ar = serializers.CharField(source="service.name_ar", read_only=True)
@@ -17,6 +26,7 @@ class TicketSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Ticket
+        list_serializer_class = TicketListSerializer
         fields = [
             "id",
             "number",
@@ -41,6 +51,7 @@ class TicketSerializer(serializers.ModelSerializer):
             "redirect_to_number",
             "customers_ahead",
             "avg_wait_time",
+            "estimated_wait_time",
         ]
         read_only_fields = [
             "id",
@@ -59,6 +70,7 @@ class TicketSerializer(serializers.ModelSerializer):
             "redirect_to_name",
             "customers_ahead",
             "avg_wait_time",
+            "estimated_wait_time",
         ]
 
     def get_called_at(self, obj):
@@ -0,0 +1,351 @@
+from datetime import timedelta
+from unittest import mock
+
+from channels.testing import WebsocketCommunicator
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone, translation
+from rest_framework.test import APITestCase
+
+from apps.counter.models import Counter
+from apps.department.models import Department
+from apps.outbox.dispatcher import OutboxDispatcher
+from apps.outbox.models import OutboxEvent
+from apps.service.models import Service
+from apps.ticket.board import BoardLockTimeout, board_store
+from apps.ticket.consumers import QueuedSendConsumer
+from apps.ticket.dispatch import call_next_customer
+from apps.ticket.models import ServiceWaitStats, Ticket, TicketSequence
+from user.models import User
+
+
+# Tests never touch the shared Redis cache the settings point at
+LOCAL_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+}
+
+
+class TicketQueryPlanTests(TestCase):
+    """
+    The hot ticket queries are answered from the indexes on Ticket.Meta.
+
+    The planner is left to choose on its own, over tables filled and
+    analyzed to the shape of a busy office: two months of tickets of ten
+    services, nearly all of them served, with a short waiting list today.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name="Department", name_ar="قسم")
+        services = [
+            Service.objects.create(
+                name=f"Service {number}",
+                name_ar="خدمة",
+                service_symbol=f"S{number}",
+                department=department,
+            )
+            for number in range(10)
+        ]
+        cls.service = services[0]
+        counters = [Counter.objects.create(number=number) for number in range(1, 11)]
+        cls.counter = counters[0]
+
+        now = timezone.now()
+        tickets = []
+        for number in range(30000):
+            created_at = now - timedelta(minutes=3 * number)
+            # The newest tickets are waiting or being served, the rest done
+            status = (
+                "waiting"
+                if number < 20
+                else "in_progress" if number < 30 else "completed"
+            )
+            tickets.append(
+                Ticket(
+                    service=services[number % 10],
+                    number=f"S{number % 10}-{number}",
+                    created_at=created_at,
+                    called_at=None if status == "waiting" else created_at,
+                    status=status,
+                    counter=None if status == "waiting" else counters[number % 10],
+                    customer_name="Customer",
+                    customer_name_ar="عميل",
+                    nationality="AE",
+                    mobile_number="0501234567",
+                    email="customer@example.com",
+                )
+            )
+        Ticket.objects.bulk_create(tickets, batch_size=5000)
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Ticket._meta.db_table}")
+
+    def assertUsesIndex(self, queryset, index_name):
+        self.assertIn(index_name, queryset.explain())
+
+    def test_waiting_list_uses_waiting_index(self):
+        queryset = (
+            Ticket.objects.filter(
+                service_id__in=[self.service.id],
+                called_at__isnull=True,
+                created_at__gte=Ticket.queue_day_start(timezone.now()),
+            )
+            .order_by("service_id", "created_at")
+            .values_list("id", "service_id")
+        )
+        self.assertUsesIndex(queryset, "ticket_waiting_idx")
+
+    def test_dispatch_claim_uses_waiting_index(self):
+        queryset = (
+            Ticket.objects.select_for_update(skip_locked=True, of=("self",))
+            .filter(
+                service_id__in=[self.service.id],
+                called_at__isnull=True,
+                created_at__gte=Ticket.queue_day_start(timezone.now()),
+            )
+            .order_by("created_at")[:1]
+        )
+        self.assertUsesIndex(queryset, "ticket_waiting_idx")
+
+    def test_counter_in_progress_uses_in_progress_index(self):
+        queryset = Ticket.objects.filter(counter=self.counter, status="in_progress")
+        self.assertUsesIndex(queryset, "ticket_in_progress_idx")
+
+    def test_todays_tickets_use_date_index(self):
+        queryset = Ticket.objects.filter(created_at__date=timezone.now().date())
+        self.assertUsesIndex(queryset, "ticket_created_date_idx")
+
+    def test_latest_first_page_uses_created_at_index(self):
+        queryset = Ticket.objects.order_by("-created_at")[:20]
+        self.assertUsesIndex(queryset, "ticket_created_at_idx")
+
+
+class TicketSequenceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name="Department", name_ar="قسم")
+        cls.service = Service.objects.create(
+            name="Service", name_ar="خدمة", service_symbol="A", department=department
+        )
+
+    def create_ticket(self, number, created_at=None):
+        Ticket.objects.create(
+            service=self.service,
+            number=number,
+            created_at=created_at or timezone.now(),
+            customer_name="Customer",
+            customer_name_ar="عميل",
+            nationality="AE",
+            mobile_number="0501234567",
+            email="customer@example.com",
+        )
+
+    def test_first_number_continues_after_tickets_numbered_by_the_view(self):
+        self.create_ticket("A-3")
+        self.create_ticket("A-12")
+        # Yesterday's numbers do not count
+        self.create_ticket("A-40", timezone.now() - timedelta(days=1))
+
+        self.assertEqual(TicketSequence.next_number(self.service), 13)
+        self.assertEqual(TicketSequence.next_number(self.service), 14)
+
+    def test_first_number_continues_after_dated_numbers(self):
+        today = timezone.now().date()
+        self.create_ticket(f"A-{today:%Y%m%d}-7")
+
+        self.assertEqual(TicketSequence.next_number(self.service), 8)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class TicketListQueryCountTests(APITestCase):
+    """A page of the ticket list costs the same queries at any size."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email="admin@example.com",
+            mobile_number="0501234567",
+            password="password",
+            name="Admin",
+            name_ar="مدير",
+            identification="784000000000001",
+            position="Manager",
+            is_superuser=True,
+        )
+        department = Department.objects.create(name="Department", name_ar="قسم")
+        services = [
+            Service.objects.create(
+                name=f"Service {symbol}",
+                name_ar="خدمة",
+                service_symbol=symbol,
+                department=department,
+            )
+            for symbol in "AB"
+        ]
+        counters = [
+            Counter.objects.create(number=number, employee=cls.user)
+            for number in (1, 2)
+        ]
+        now = timezone.now()
+        for service in services:
+            ServiceWaitStats.record_wait(service.id, now.date(), 60)
+            ServiceWaitStats.record_service_time(service.id, now.date(), 120)
+
+        # Called tickets with every related row set, and waiting ones whose
+        # customers_ahead comes from the waiting lists
+        tickets = []
+        for number in range(1000):
+            called = number % 2 == 0
+            tickets.append(
+                Ticket(
+                    service=services[number % 2],
+                    number=f"{services[number % 2].service_symbol}-{number}",
+                    created_at=now - timedelta(seconds=1000 - number),
+                    called_at=now if called else None,
+                    status="in_progress" if called else "waiting",
+                    served_by=cls.user if called else None,
+                    counter=counters[number % 2] if called else None,
+                    redirect_to=counters[(number + 1) % 2] if called else None,
+                    customer_name="Customer",
+                    customer_name_ar="عميل",
+                    nationality="AE",
+                    mobile_number="0501234567",
+                    email="customer@example.com",
+                )
+            )
+        Ticket.objects.bulk_create(tickets)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        # URLs carry the language prefix
+        translation.activate("en")
+        self.addCleanup(translation.deactivate)
+
+    def list_tickets(self, page_size):
+        response = self.client.get(
+            reverse("ticket:ticket-list"), {"page_size": page_size}
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()["results"]
+
+    def test_list_queries_do_not_grow_with_page_size(self):
+        # The count, the page with its related rows, the waiting lists
+        # (customers_ahead) and the wait statistics
+        with self.assertNumQueries(4):
+            tickets = self.list_tickets(5)
+        self.assertEqual(len(tickets), 5)
+
+        with self.assertNumQueries(4):
+            tickets = self.list_tickets(1000)
+        self.assertEqual(len(tickets), 1000)
+
+        # Newest first: the last ticket is waiting behind 499 others
+        self.assertEqual(tickets[0]["customers_ahead"], 499)
+        self.assertEqual(tickets[0]["estimated_wait_time"], 499 * 120)
+        self.assertEqual(tickets[1]["served_by_name"], "Admin")
+        self.assertEqual(tickets[1]["counter_number"], 1)
+        self.assertEqual(tickets[1]["redirect_to_number"], "2")
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class CallNextCustomerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name="Department", name_ar="قسم")
+        cls.service = Service.objects.create(
+            name="Service", name_ar="خدمة", service_symbol="A", department=department
+        )
+        cls.counter = Counter.objects.create(number=1)
+        cls.counter.departments.add(department)
+        cls.ticket = Ticket.objects.create(
+            service=cls.service,
+            number="A-1",
+            created_at=timezone.now() - timedelta(minutes=5),
+            customer_name="Customer",
+            customer_name_ar="عميل",
+            nationality="AE",
+            mobile_number="0501234567",
+            email="customer@example.com",
+        )
+
+    def test_wait_statistics_are_updated_after_the_claim_commits(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(call_next_customer(self.counter, None), self.ticket)
+        # Not written, and so not locked, inside the claim transaction
+        self.assertFalse(ServiceWaitStats.objects.exists())
+
+        for callback in callbacks:
+            callback()
+        stats = ServiceWaitStats.objects.get(service=self.service)
+        self.assertEqual(stats.wait_count, 1)
+        self.assertGreaterEqual(stats.wait_mean, 300)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class BoardLockTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name="Department", name_ar="قسم")
+        cls.service = Service.objects.create(
+            name="Service", name_ar="خدمة", service_symbol="A", department=department
+        )
+        cls.counter = Counter.objects.create(number=1)
+
+    def setUp(self):
+        # board_store keeps its own cache client; make it use LOCAL_CACHES
+        self.reset_board_cache()
+        self.addCleanup(self.reset_board_cache)
+        # Another worker holds the board lock
+        board_store.cache.set(board_store.lock_key, "other", timeout=60)
+        self.addCleanup(board_store.cache.delete, board_store.lock_key)
+        patcher = mock.patch.object(board_store, "lock_timeout", 0.05)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def reset_board_cache(self):
+        board_store.__dict__.pop("cache", None)
+
+    def test_lock_held_elsewhere_times_out(self):
+        with self.assertRaises(BoardLockTimeout):
+            with board_store.locked():
+                pass
+        self.assertEqual(board_store.cache.get(board_store.lock_key), "other")
+
+    def test_board_changes_stay_queued_while_lock_held_elsewhere(self):
+        Ticket.objects.create(
+            service=self.service,
+            counter=self.counter,
+            status="in_progress",
+            called_at=timezone.now(),
+            customer_name="Customer",
+            customer_name_ar="عميل",
+            nationality="AE",
+            mobile_number="0501234567",
+            email="customer@example.com",
+        )
+
+        with self.assertLogs("apps.outbox.dispatcher", "ERROR"):
+            OutboxDispatcher().dispatch_batch()
+
+        event = OutboxEvent.objects.get(message__type="board_change")
+        self.assertEqual(event.attempts, 1)
+
+
+class FailingSendConsumer(QueuedSendConsumer):
+    async def connect(self):
+        await self.accept()
+        self.queue_frame("{}")
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        raise ConnectionResetError
+
+
+class QueuedSendConsumerTests(SimpleTestCase):
+    async def test_failed_send_is_logged_and_closes_the_connection(self):
+        communicator = WebsocketCommunicator(FailingSendConsumer.as_asgi(), "/")
+        with self.assertLogs("apps.ticket.consumers", "ERROR"):
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            message = await communicator.receive_output()
+        self.assertEqual(message["type"], "websocket.close")
+        await communicator.disconnect()
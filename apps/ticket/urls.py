@@ -2,6 +2,7 @@ from django.urls import path
 from apps.ticket.views import (
     TicketCreateView,
     TicketListView,
+    TicketExportCSVView,
     TicketRetrieveView,
     CallNextCustomerView,
     TicketUpdateView,
@@ -18,6 +19,7 @@ app_name = "ticket"
 urlpatterns = [
     path("ticket_create/", TicketCreateView.as_view(), name="ticket-create"),
     path("ticket_list/", TicketListView.as_view(), name="ticket-list"),
+    path("ticket_export_csv/", TicketExportCSVView.as_view(), name="ticket-export-csv"),
     path("ticket_retrieve/", TicketRetrieveView.as_view(), name="ticket-retrieve"),
     path(
         "call_next_customer/", CallNextCustomerView.as_view(), name="call_next_customer"
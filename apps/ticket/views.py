@@ -2,21 +2,18 @@ from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.filters import SearchFilter, OrderingFilter
-from rest_framework.exceptions import ValidationError
 from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
 
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from qms_api.authentication import CachedJWTAuthentication
 
 from django.shortcuts import get_object_or_404
 from django.utils.translation import gettext_lazy as _
-from django.utils import timezone
 from django.utils.timezone import now
-from django.db.models import Q, Max
 
-from apps.service.models import Service
-from apps.ticket.models import Ticket
+from apps.ticket.models import Ticket, TicketSequence
 from apps.ticket.filters import TicketFilter
+from apps.ticket.dispatch import call_next_customer
 from apps.ticket.serializers import (
     TicketSerializer,
     CallNextCustomerSerializer,
@@ -25,8 +22,12 @@ from apps.ticket.serializers import (
     TicketStatusDialogSerializer,
 )
 
-from qms_api.pagination import StandardResultsSetPagination
+from qms_api.pagination import (
+    KeysetResultsSetPagination,
+    StandardResultsSetPagination,
+)
 from qms_api.custom_permissions import HasPermissionOrInGroupWithPermission
+from qms_api.util import csv_export_response
 from apps.counter.models import Counter
 
 
@@ -57,32 +58,21 @@ class TicketCreateView(generics.CreateAPIView):
         return ticket_number
 
     def get_next_sequential_number(self, service):
-        current_date = timezone.now().date()
-        latest_ticket_number = (
-            Ticket.objects.filter(
-                service=service,
-                created_at__date=current_date,
-                number__startswith=f"{service.service_symbol}-",
-            )
-            .order_by("-created_at")
-            .first()
-        )
-
-        if not latest_ticket_number:
-            return 1
-
-        try:
-            sequential_number = int(latest_ticket_number.number.split("-")[-1])
-            return sequential_number + 1
-        except (IndexError, ValueError):
-            return 1
+        return TicketSequence.next_number(service)
 
 
 class TicketListView(generics.ListAPIView):
-    queryset = Ticket.objects.all().order_by("-created_at")
+    # Related rows are joined in; customers_ahead and the wait times are
+    # resolved per page by TicketListSerializer, so a page costs a fixed
+    # number of queries whatever its size
+    queryset = (
+        Ticket.objects.all()
+        .select_related("service", "served_by", "counter", "redirect_to")
+        .order_by("-created_at")
+    )
     serializer_class = TicketSerializer
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "ticket.view_ticket"
     ordering_fields = [
@@ -92,8 +82,57 @@ class TicketListView(generics.ListAPIView):
         "mobile_number",
         "email",
     ]
-    pagination_class = StandardResultsSetPagination
+    pagination_class = KeysetResultsSetPagination
+    filterset_class = TicketFilter
+
+
+class TicketExportCSVView(generics.ListAPIView):
+    """Stream the tickets selected with the TicketFilter parameters as CSV."""
+
+    queryset = Ticket.objects.all().order_by("created_at", "id")
+    filter_backends = [DjangoFilterBackend]
     filterset_class = TicketFilter
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
+    permission_codename = "ticket.view_ticket"
+
+    def list(self, request, *args, **kwargs):
+        return csv_export_response(
+            "tickets.csv",
+            [
+                _("Number"),
+                _("Service"),
+                _("Status"),
+                _("Customer Name"),
+                _("Customer Name Arabic"),
+                _("Nationality"),
+                _("Mobile Number"),
+                _("Email"),
+                _("Counter"),
+                _("Served By"),
+                _("Redirected To"),
+                _("Hold Reason"),
+                _("Created At"),
+                _("Called At"),
+            ],
+            self.filter_queryset(self.get_queryset()),
+            [
+                "number",
+                "service__name",
+                "status",
+                "customer_name",
+                "customer_name_ar",
+                "nationality",
+                "mobile_number",
+                "email",
+                "counter__number",
+                "served_by__name",
+                "redirect_to__number",
+                "hold_reason",
+                "created_at",
+                "called_at",
+            ],
+        )
 
 
 class TicketRetrieveView(generics.RetrieveAPIView):
@@ -110,44 +149,33 @@ class TicketRetrieveView(generics.RetrieveAPIView):
 class CallNextCustomerView(generics.UpdateAPIView):
     queryset = Ticket.objects.all()
     serializer_class = CallNextCustomerSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def update(self, request, *args, **kwargs):
         # counter_id = request.data.get("counter_id")
+        # CachedJWTAuthentication resolves the counters of the user already
+        counter_ids = getattr(self.request.user, "counter_ids", None)
+        if counter_ids is not None:
+            counter_lookup = {"id__in": counter_ids}
+        else:
+            counter_lookup = {"employee": self.request.user}
         try:
-            counter = Counter.objects.get(employee=self.request.user)
+            counter = Counter.objects.get(**counter_lookup)
         except Counter.DoesNotExist:
             return Response(
                 {"detail": _("No counter is associated with the logged-in user.")},
                 status=status.HTTP_404_NOT_FOUND,
             )
 
-        # Use the counter's ID
-        counter_id = counter.id
-        if not counter_id:
-            return Response(
-                {"detail": _("Counter ID is required.")},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        next_customer = self.get_next_customer(counter_id)
+        next_customer = call_next_customer(counter, self.request.user)
 
         if next_customer:
-            current_customer = self.get_current_customer(counter_id)
-
-            if current_customer:
-                self.complete_ticket(current_customer)
-
-            self.update_ticket(next_customer, counter_id)
-
             return Response(
                 {
                     "detail": _("Next customer called successfully."),
                     "ticket_id": next_customer.id,
-                    "counter_number": (
-                        next_customer.counter.number if next_customer.counter else None
-                    ),
+                    "counter_number": counter.number,
                     "ticket_number": next_customer.number,
                 },
                 status=status.HTTP_200_OK,
@@ -158,55 +186,10 @@ class CallNextCustomerView(generics.UpdateAPIView):
                 status=status.HTTP_404_NOT_FOUND,
             )
 
-    def get_next_customer(self, counter_id):
-        try:
-            counter = Counter.objects.prefetch_related("departments").get(id=counter_id)
-            services = Service.objects.filter(department__in=counter.departments.all())
-            today = now().date()
-            next_customer = (
-                Ticket.objects.filter(
-                    service__in=services,
-                    called_at__isnull=True,
-                    created_at__date=today,
-                )
-                .order_by("created_at")
-                .first()
-            )
-            return next_customer
-        except Counter.DoesNotExist:
-            raise ValidationError({"detail": _("Counter does not exist.")})
-
-    def get_current_customer(self, counter_id):
-        current_customer = Ticket.objects.filter(
-            Q(counter__employee=self.request.user) & Q(status="in_progress")
-        ).first()
-        return current_customer
-
-    def update_ticket(self, ticket, counter_id):
-        try:
-            counter = Counter.objects.get(id=counter_id, employee=self.request.user)
-            ticket.called_at = timezone.now()
-            ticket.status = "in_progress"
-            ticket.served_by = self.request.user
-            ticket.counter = counter
-            ticket.save()
-        except Counter.DoesNotExist:
-            raise ValidationError(
-                {
-                    "detail": _(
-                        "Counter does not exist or is not associated with the logged-in user."
-                    )
-                }
-            )
-
-    def complete_ticket(self, ticket):
-        ticket.status = "completed"
-        ticket.save()
-
 
 class TicketRedirectToAnotherCounter(generics.UpdateAPIView):
     serializer_class = TicketRedirectSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "ticket.change_ticket"
 
@@ -247,7 +230,7 @@ class TicketRedirectToAnotherCounter(generics.UpdateAPIView):
 
 class TicketUpdateView(generics.RetrieveUpdateAPIView):
     serializer_class = TicketSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "ticket.change_ticket"
 
@@ -271,9 +254,11 @@ class TicketUpdateView(generics.RetrieveUpdateAPIView):
 
 
 class TicketInCounter(generics.ListAPIView):
-    queryset = Ticket.objects.filter(status="in_progress")
+    queryset = Ticket.objects.filter(status="in_progress").select_related(
+        "service", "served_by", "counter", "redirect_to"
+    )
     serializer_class = TicketSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "ticket.view_ticket"
 
@@ -281,7 +266,7 @@ class TicketInCounter(generics.ListAPIView):
 
 
 class TicketDeleteView(generics.DestroyAPIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "ticket.delete_ticket"
 
@@ -298,7 +283,7 @@ class TicketDeleteView(generics.DestroyAPIView):
 
 
 class TicketDialogView(generics.ListAPIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "ticket.view_ticket"
     queryset = Ticket.objects.all()
@@ -306,14 +291,14 @@ class TicketDialogView(generics.ListAPIView):
 
 
 class TicketInProgressTodayDialogView(generics.ListAPIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
     serializer_class = TicketDialogSerializer
     def get_queryset(self):
         today = now().date()  # Get the current date
         return Ticket.objects.filter(status="in_progress", created_at__date=today)
 class TicketStatusDialogView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
     # permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     # permission_codename = "ticket.view_ticket"
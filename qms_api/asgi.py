@@ -32,19 +32,59 @@ import django
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "qms_api.settings")
 django.setup()
-from django.core.asgi import get_asgi_application
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 from apps.ticket.routing import websocket_urlpatterns as ticket_patterns
 from apps.invoice.routing import websocket_urlpatterns as invoice_patterns
 
 
+class StreamingASGIHandler(ASGIHandler):
+    """
+    ``ASGIHandler`` that sends responses streaming from an async iterator
+    (``qms_api.util.AsyncStreamingHttpResponse``) part by part, awaiting
+    each part, as Django 4.2 does. Django 4.1 iterates streaming responses
+    synchronously inside the event loop, where database reads fail.
+    """
+
+    async def send_response(self, response, send):
+        if not getattr(response, "is_async", False):
+            return await super().send_response(response, send)
+
+        response_headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode("ascii")
+            if isinstance(value, str):
+                value = value.encode("latin1")
+            response_headers.append((bytes(header), bytes(value)))
+        for cookie in response.cookies.values():
+            response_headers.append(
+                (b"Set-Cookie", cookie.output(header="").encode("ascii").strip())
+            )
+        await send(
+            {
+                "type": "http.response.start",
+                "status": response.status_code,
+                "headers": response_headers,
+            }
+        )
+        async for part in response:
+            for chunk, _ in self.chunk_bytes(part):
+                await send(
+                    {"type": "http.response.body", "body": chunk, "more_body": True}
+                )
+        await send({"type": "http.response.body"})
+        await sync_to_async(response.close, thread_sensitive=True)()
+
+
 # Combine WebSocket URL patterns from all apps
 all_websocket_urlpatterns = ticket_patterns + invoice_patterns
 
 application = ProtocolTypeRouter(
     {
-        "http": get_asgi_application(),
+        "http": StreamingASGIHandler(),
         "websocket": AuthMiddlewareStack(URLRouter(all_websocket_urlpatterns)),
     }
 )
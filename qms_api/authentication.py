@@ -0,0 +1,171 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from qms_api.cache import VersionedCache
+from qms_api.custom_permissions import user_permissions
+
+
+class UserPrincipalCache(VersionedCache):
+    """
+    What authenticating a request needs of each user, kept in the shared
+    cache for a short while: a few fields of the user, their effective
+    permissions, the IDs of the counters assigned to them and a fingerprint
+    of their password for token revocation, so resolving the user of a
+    request needs no queries. The user is rebuilt from these with the other
+    fields deferred; the password hash itself is never cached. The profile
+    returned on login is cached the same way.
+
+    Each entry is dropped when its user is saved or deleted; changes of
+    groups, permissions or counters bump a version that outdates them all.
+    """
+
+    version_key = "auth_principal:version"
+    fields = ("id", "is_active", "is_deleted", "is_staff", "is_superuser")
+
+    def __init__(self):
+        self.timeout = getattr(settings, "AUTH_PRINCIPAL_TIMEOUT", 300)
+
+    def _keys(self, user_id):
+        return f"auth_principal:{user_id}", f"login_profile:{user_id}"
+
+    def _cached(self, key, load):
+        # The version and the entry come back in a single round trip
+        cached = cache.get_many([self.version_key, key])
+        version = cached.get(self.version_key)
+        if version is None:
+            version = self._new_version()
+
+        entry = cached.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        value = load()
+        cache.set(key, (version, value), timeout=self.timeout)
+        return value
+
+    def _user(self, values):
+        from user.models import User
+
+        # The cached fields in model order, everything else deferred
+        field_names = [
+            field.attname
+            for field in User._meta.concrete_fields
+            if field.attname in values
+        ]
+        return User.from_db(
+            router.db_for_read(User),
+            field_names,
+            [values[field_name] for field_name in field_names],
+        )
+
+    def _load(self, user_id):
+        from apps.counter.models import Counter
+        from user.models import User
+
+        row = (
+            User.objects.filter(**{api_settings.USER_ID_FIELD: user_id})
+            .values(*self.fields, "password")
+            .first()
+        )
+        if row is None:
+            return None
+        password = row.pop("password")
+        user = self._user(row)
+        return {
+            "fields": row,
+            "effective_permissions": user_permissions.get(user),
+            "counter_ids": list(
+                Counter.objects.filter(employee=user).values_list("id", flat=True)
+            ),
+            "password_fingerprint": get_md5_hash_password(password),
+        }
+
+    def _load_login_profile(self, user):
+        from apps.counter.models import Counter
+
+        return {
+            "groups": list(user.groups.values_list("name", flat=True)),
+            "user_permissions": list(
+                user.user_permissions.values_list("codename", flat=True)
+            ),
+            "counters": [
+                {"id": str(counter_id), "number": number}
+                for counter_id, number in Counter.objects.filter(
+                    employee=user, is_active=True, is_deleted=False
+                )
+                .order_by("number")
+                .values_list("id", "number")
+            ],
+        }
+
+    def get(self, user_id):
+        """
+        The user with ``user_id``, or ``None`` when there is none, carrying
+        ``effective_permissions``, ``counter_ids`` and
+        ``password_fingerprint``.
+        """
+        principal = self._cached(
+            self._keys(user_id)[0], lambda: self._load(user_id)
+        )
+        if principal is None:
+            return None
+        user = self._user(principal["fields"])
+        user.effective_permissions = principal["effective_permissions"]
+        user.counter_ids = principal["counter_ids"]
+        user.password_fingerprint = principal["password_fingerprint"]
+        return user
+
+    def login_profile(self, user):
+        """
+        The group names, own permission codenames and active counters of
+        ``user``, as returned on login.
+        """
+        return self._cached(
+            self._keys(user.pk)[1], lambda: self._load_login_profile(user)
+        )
+
+    def forget(self, user_id):
+        """Drop the cached entries of one user."""
+        cache.delete_many(self._keys(user_id))
+
+
+user_principals = UserPrincipalCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    ``JWTAuthentication`` that resolves the user of the token from
+    ``user_principals`` instead of loading it on every request. Inactive and
+    deleted users are rejected.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = user_principals.get(str(user_id))
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if not user.is_active or user.is_deleted:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if (
+                validated_token.get(api_settings.REVOKE_TOKEN_CLAIM)
+                != user.password_fingerprint
+            ):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
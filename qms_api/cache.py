@@ -0,0 +1,34 @@
+import time
+
+from django.core.cache import cache
+
+
+class VersionedCache:
+    """
+    Base for caches whose entries all hang off one version number kept in
+    the shared cache. Entries are stored together with, or under, the
+    version they were loaded at; bumping the version outdates all of them at
+    once, in every process.
+    """
+
+    version_key = None
+
+    def _version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            version = self._new_version()
+        return version
+
+    def _new_version(self):
+        # Start from a fresh number so entries cached under an evicted
+        # version are never picked up again
+        cache.add(self.version_key, time.time_ns(), timeout=None)
+        return cache.get(self.version_key)
+
+    def invalidate(self):
+        """Outdate every cached entry, in all processes."""
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            # No version yet: the next lookup starts a new one
+            pass
@@ -1,5 +1,62 @@
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
 from rest_framework.permissions import BasePermission
 
+from qms_api.cache import VersionedCache
+
+
+class UserPermissionCache(VersionedCache):
+    """
+    Effective permissions of each user, cached in process and in the shared
+    cache under one version number that any permission or group membership
+    change bumps, so checking a permission costs no queries once cached.
+    """
+
+    version_key = "user_permissions:version"
+    timeout = 60 * 60
+
+    def __init__(self):
+        self._local = {}
+
+    def _load(self, user):
+        # "app_label.codename" of the user's and their groups' permissions,
+        # as checked by user.has_perm, plus the bare codenames of the group
+        # permissions
+        group_permissions = set(
+            Permission.objects.filter(group__user=user).values_list(
+                "content_type__app_label", "codename"
+            )
+        )
+        user_permissions = set(
+            user.user_permissions.values_list("content_type__app_label", "codename")
+        )
+        return frozenset(
+            {
+                f"{app_label}.{codename}"
+                for app_label, codename in group_permissions | user_permissions
+            }
+            | {codename for _, codename in group_permissions}
+        )
+
+    def get(self, user):
+        """The set of permission names ``user`` holds."""
+        version = self._version()
+        local = self._local.get(user.pk)
+        if local is not None and local[0] == version:
+            return local[1]
+
+        key = f"user_permissions:{version}:{user.pk}"
+        permissions = cache.get(key)
+        if permissions is None:
+            permissions = self._load(user)
+            cache.set(key, permissions, timeout=self.timeout)
+        self._local[user.pk] = (version, permissions)
+        return permissions
+
+
+user_permissions = UserPermissionCache()
+
+
 class HasPermissionOrInGroupWithPermission(BasePermission):
     """
     Custom permission to check if the user has the required permission or
@@ -14,14 +71,17 @@ class HasPermissionOrInGroupWithPermission(BasePermission):
             # If no permission_codename is set on the view, deny permission
             return False
 
-        # 1. Check if the user has the permission directly
-        if request.user.has_perm(permission_codename):
-            return True
+        user = request.user
+        if not user.is_authenticated or not user.is_active:
+            return False
 
-        # 2. Check if the user belongs to a group with the required permission
-        for group in request.user.groups.all():
-            if group.permissions.filter(codename=permission_codename).exists():
-                return True
+        # Superusers hold every permission, as with user.has_perm
+        if user.is_superuser:
+            return True
 
-        # If neither condition is met, deny permission
-        return False
+        # Permissions of the user itself and of its groups, resolved along
+        # with the user by CachedJWTAuthentication or taken from the cache
+        permissions = getattr(user, "effective_permissions", None)
+        if permissions is None:
+            permissions = user_permissions.get(user)
+        return permission_codename in permissions
@@ -1,5 +1,14 @@
+import base64
+import json
+
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
 from django.utils.translation import gettext_lazy as _
 
 # class StandardResultsSetPagination(PageNumberPagination):
@@ -29,4 +38,108 @@ class StandardResultsSetPagination(PageNumberPagination):
                 "previous": self.get_previous_link(),
                 "results": data,
             }
-        )
\ No newline at end of file
+        )
+
+
+def estimate_count(queryset):
+    """Row count estimated by the query planner, without running a COUNT(*)."""
+    sql, params = queryset.query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]["Plan Rows"]
+
+
+class KeysetResultsSetPagination(StandardResultsSetPagination):
+    """
+    Page numbers by default; passing ``cursor`` (empty for the first page)
+    switches to keyset pagination on ``(created_at, id)``, newest first.
+
+    A keyset page is a range scan that starts right after the previous page,
+    so deep pages cost the same as the first one and rows inserted meanwhile
+    never shift the pages. Its count is left out unless ``count=exact`` or
+    ``count=estimate`` is asked for.
+    """
+
+    cursor_query_param = "cursor"
+    count_query_param = "count"
+    invalid_cursor_message = _("Invalid cursor")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params:
+            self.keyset = False
+            return super().paginate_queryset(queryset, request, view)
+
+        self.keyset = True
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.count = self.get_count(queryset, request)
+
+        # Keyset order is fixed, any other ordering is replaced
+        queryset = queryset.order_by("-created_at", "-id")
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            created_at, pk = position
+            # The plain bound lets the index scan start at the cursor instead
+            # of filtering its way down from the newest row
+            queryset = queryset.filter(created_at__lte=created_at).filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+            )
+
+        results = list(queryset[: self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        results = results[: self.page_size]
+        self.next_position = (
+            (results[-1].created_at, results[-1].pk) if self.has_next else None
+        )
+        return results
+
+    def get_count(self, queryset, request):
+        mode = request.query_params.get(self.count_query_param)
+        if mode == "exact":
+            return queryset.count()
+        if mode == "estimate":
+            return estimate_count(queryset)
+        return None
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            created_at, pk = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            created_at = parse_datetime(created_at)
+            pk = model._meta.pk.to_python(pk)
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if created_at is None or pk is None:
+            raise NotFound(self.invalid_cursor_message)
+        return created_at, pk
+
+    def encode_cursor(self, position):
+        created_at, pk = position
+        encoded = json.dumps([created_at.isoformat(), str(pk)]).encode()
+        return base64.urlsafe_b64encode(encoded).decode()
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.next_position)
+        )
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response(
+            {
+                "count": self.count,
+                "next": self.get_next_link(),
+                "results": data,
+            }
+        )
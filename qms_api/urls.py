@@ -31,6 +31,7 @@ urlpatterns += i18n_patterns(
     path('api/PRO/',include('apps.PRO.urls')),
     path('api/invoice/',include('apps.invoice.urls')),
     path('api/rating/',include('apps.rating.urls')),
+    path('api/report/',include('apps.report.urls')),
 )
 
 if settings.DEBUG:
@@ -1,10 +1,19 @@
 import string, random
+import csv
+import hashlib
+import json
+import threading
+from functools import lru_cache
+from itertools import islice
+
+import django
+from asgiref.sync import async_to_sync, sync_to_async
 from django.db.models.signals import pre_save, post_migrate
 from django.dispatch import receiver
 from django.utils.text import slugify
 from django.apps import apps
 from django.db.models import Q
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils.translation import gettext_lazy as _
 from rest_framework.views import APIView
 from django.contrib.auth.models import Group, Permission
@@ -34,6 +43,7 @@ import barcode
 from barcode.writer import ImageWriter
 
 
+@lru_cache(maxsize=1024)
 def format_arabic_text(text):
     """Reshape and reorder Arabic text for proper rendering."""
     reshaped_text = arabic_reshaper.reshape(text)
@@ -41,86 +51,11 @@ def format_arabic_text(text):
     return bidi_text
 
 
-def generate_invoice_pdf(invoice):
-    # Define the file path
-    file_name = f"{invoice.id}.pdf"
-    file_path = os.path.join(
-        settings.MEDIA_ROOT, "uploads", "invoice", "pdf", file_name
-    )
-
-    # Ensure the directory exists
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-
-    # Define the path to the Arimo and NotoSansArabic font files
-    font_path = os.path.join(settings.BASE_DIR, "fonts", "Arimo-Regular.ttf")
-    arabic_font_path = os.path.join(
-        settings.BASE_DIR, "fonts", "NotoSansArabic-VariableFont_wdth,wght.ttf"
-    )
-
-    # Check if the font files exist
-    if not os.path.exists(font_path):
-        raise FileNotFoundError(f"Font file not found at: {font_path}")
-    if not os.path.exists(arabic_font_path):
-        raise FileNotFoundError(f"Arabic font file not found at: {arabic_font_path}")
-
-    # Register the fonts
-    pdfmetrics.registerFont(TTFont("Arimo", font_path))
-    pdfmetrics.registerFont(TTFont("NotoSansArabic", arabic_font_path))
-
-    # Create the PDF document with adjusted margins
-    pdf = SimpleDocTemplate(
-        file_path, pagesize=A4, leftMargin=10, rightMargin=10
-    )  # Reduced margins
-    elements = []
-
-    # Define styles
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        name="TitleStyle",
-        parent=styles["Title"],
-        fontSize=12,  # Reduced font size
-        alignment=1,  # Center alignment
-    )
-    normal_style = ParagraphStyle(
-        name="NormalStyle",
-        parent=styles["Normal"],
-        fontSize=7,  # Further reduced font size for better fit
-        fontName="Arimo",  # Use Arimo for English text
-    )
-    arabic_style = ParagraphStyle(
-        name="ArabicStyle",
-        parent=styles["Normal"],
-        fontSize=7,  # Further reduced font size for better fit
-        fontName="NotoSansArabic",  # Use NotoSansArabic for Arabic text
-        alignment=2,  # Right alignment for Arabic text
-    )
-
-    # Add logo
-    logo_path = os.path.join(
-        settings.MEDIA_ROOT, "default_photos", "quickStop-logo.png"
-    )
-    if os.path.exists(logo_path):
-        logo = Image(
-            logo_path, width=100, height=50
-        )  # Adjust width and height as needed
-        logo.hAlign = "LEFT"
-        elements.append(logo)
-        elements.append(Spacer(1, 12))
-
-    # Add title
-    elements.append(Paragraph("TAX INVOICE", title_style))
-    elements.append(Spacer(1, 12))
-
-    # Generate barcode
-    barcode_class = barcode.get_barcode_class("code128")
-    barcode_instance = barcode_class(str(invoice.id), writer=ImageWriter())
-    barcode_buffer = BytesIO()
-    barcode_instance.write(barcode_buffer)
-    barcode_image = Image(barcode_buffer, width=200, height=50)
-    elements.append(barcode_image)
-    elements.append(Spacer(1, 12))
-
-    # Add invoice details in the top right
+def invoice_document(invoice):
+    """
+    Everything the invoice PDF shows, as plain values, so it can be rendered
+    without database access (e.g. in a worker process).
+    """
     details = [
         ["INV NO:", invoice.id],
         ["Token No:", invoice.token_no],
@@ -131,42 +66,12 @@ def generate_invoice_pdf(invoice):
         ["Contact Name:", invoice.contact_name],
         ["Contact No:", invoice.contact_no],
     ]
-    details_table = Table(details, colWidths=[80, 180])  # Adjusted column widths
-    details_table.setStyle(
-        TableStyle(
-            [
-                ("ALIGN", (0, 0), (-1, -1), "RIGHT"),
-                ("FONTNAME", (0, 0), (-1, -1), "Arimo"),  # Use Arimo for details
-                ("FONTSIZE", (0, 0), (-1, -1), 7),  # Reduced font size
-                ("BOTTOMPADDING", (0, 0), (-1, -1), 5),
-            ]
-        )
-    )
-    elements.append(details_table)
-    elements.append(Spacer(1, 12))
-
-    # Add line items
-    line_items = [
-        [
-            "NO",
-            "DEPARTMENT",
-            "SERVICE NAME",
-            "GOV FEE",
-            "QTY",
-            "GOV. TOTAL",
-            "SERVICE",
-            "TYPING",
-            "ADDFEE",
-            "VAT",
-            "FINS",  # New column for fins
-            "TOTAL",
-            "REFNO 1",
-            "REFNO 2",
-            "REFNO 3",
-        ]
-    ]
 
-    for index, item in enumerate(invoice.line_items.all(), start=1):
+    rows = []
+    line_items = invoice.line_items.all()
+    if "line_items" not in getattr(invoice, "_prefetched_objects_cache", {}):
+        line_items = line_items.select_related("service__department")
+    for index, item in enumerate(line_items, start=1):
         department_name = (
             item.service.department.name if item.service.department else ""
         )
@@ -189,7 +94,7 @@ def generate_invoice_pdf(invoice):
         ref_no2 = item.ref_no2 or ""
         ref_no3 = item.ref_no3 or ""
 
-        line_items.append(
+        rows.append(
             [
                 str(index),
                 department_name,
@@ -209,141 +114,340 @@ def generate_invoice_pdf(invoice):
             ]
         )
 
-    # Define column widths for the line items table
-    col_widths = [
-        15,
-        60,
-        90,
-        35,
-        20,
-        40,
-        35,
-        35,
-        35,
-        35,
-        35,
-        35,
-        35,
-        35,
-        35,
-    ]  # Adjusted widths
-
-    # Create the line items table
-    line_items_table = Table(line_items, colWidths=col_widths)
-    line_items_table.setStyle(
-        TableStyle(
-            [
-                # Header row styling
-                ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
-                ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
-                ("ALIGN", (0, 0), (-1, 0), "CENTER"),
-                ("FONTNAME", (0, 0), (-1, 0), "Arimo"),  # Use Arimo for headers
-                ("FONTSIZE", (0, 0), (-1, 0), 7),  # Reduced font size
-                ("BOTTOMPADDING", (0, 0), (-1, 0), 12),
-                # Body row styling
-                ("BACKGROUND", (0, 1), (-1, -1), colors.beige),
-                ("GRID", (0, 0), (-1, -1), 1, colors.black),
-                # Cell padding
-                ("PADDING", (0, 0), (-1, -1), 5),  # Add padding to all cells
-                # Align text columns to the left
-                ("ALIGN", (1, 1), (2, -1), "LEFT"),  # DEPARTMENT and SERVICE NAME
-                # Align numeric columns to the right
-                ("ALIGN", (3, 1), (-1, -1), "RIGHT"),  # GOV FEE, QTY, GOV. TOTAL, etc.
-                # Font size for body
-                ("FONTSIZE", (0, 1), (-1, -1), 7),  # Reduced font size
-                # Wrap text for headers and cells
-                (
-                    "WORDWRAP",
-                    (0, 0),
-                    (-1, -1),
-                    True,
-                ),  # Enable text wrapping for all cells
+    document = {
+        "id": str(invoice.id),
+        "details": details,
+        "line_items": rows,
+        "totals": {
+            field: f"{float(getattr(invoice, field)):.2f}"
+            for field in [
+                "total_gov_fee",
+                "total_service_fee",
+                "total_typing_fee",
+                "vat",
+                "total_additional_fee",
+                "total_fins",
+                "grand_total",
             ]
-        )
-    )
-    elements.append(line_items_table)
-    elements.append(Spacer(1, 12))
+        },
+    }
+    # Identifies the printout, the PDF only has to be rendered again when
+    # this changes
+    document["hash"] = hashlib.sha256(
+        json.dumps(document, sort_keys=True).encode()
+    ).hexdigest()
+    return document
+
+
+class InvoicePDFRenderer:
+    """
+    Renders invoice PDFs.
+
+    Everything that does not depend on the invoice (fonts, paragraph and
+    table styles, the logo and the shaped footer text) is loaded on the first
+    render and reused by every later one in the process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _load(self):
+        with self._lock:
+            if self._loaded:
+                return
+
+            # Define the path to the Arimo and NotoSansArabic font files
+            font_path = os.path.join(settings.BASE_DIR, "fonts", "Arimo-Regular.ttf")
+            arabic_font_path = os.path.join(
+                settings.BASE_DIR, "fonts", "NotoSansArabic-VariableFont_wdth,wght.ttf"
+            )
 
-    # Add totals and footer in a two-column layout
-    totals_footer_table = Table(
-        [
-            [
-                Paragraph(
-                    format_arabic_text(
-                        "المركز غير مسؤول عن أي معاملة بعد ثلاثة أيام من تاريخ الانجاز"
-                    ),
-                    arabic_style,
-                ),
-                Paragraph("Total Govt Fee:", normal_style),
-                f"{float(invoice.total_gov_fee):.2f}",
-            ],
-            [
-                Paragraph(
-                    format_arabic_text(
-                        "يرجى مراجعة بيانات المعاملة حيث اننا مسؤولون عنها قبل تسليمها للعمل"
-                    ),
-                    arabic_style,
-                ),
-                Paragraph("Total Service Fee:", normal_style),
-                f"{float(invoice.total_service_fee):.2f}",
-            ],
-            [
-                Paragraph(
-                    "The Center is not responsible for any transaction after 3 Days from completion",
-                    normal_style,
+            # Check if the font files exist
+            if not os.path.exists(font_path):
+                raise FileNotFoundError(f"Font file not found at: {font_path}")
+            if not os.path.exists(arabic_font_path):
+                raise FileNotFoundError(
+                    f"Arabic font file not found at: {arabic_font_path}"
+                )
+
+            # Register the fonts
+            registered_fonts = pdfmetrics.getRegisteredFontNames()
+            if "Arimo" not in registered_fonts:
+                pdfmetrics.registerFont(TTFont("Arimo", font_path))
+            if "NotoSansArabic" not in registered_fonts:
+                pdfmetrics.registerFont(TTFont("NotoSansArabic", arabic_font_path))
+
+            # Define styles
+            styles = getSampleStyleSheet()
+            self.title_style = ParagraphStyle(
+                name="TitleStyle",
+                parent=styles["Title"],
+                fontSize=12,  # Reduced font size
+                alignment=1,  # Center alignment
+            )
+            self.normal_style = ParagraphStyle(
+                name="NormalStyle",
+                parent=styles["Normal"],
+                fontSize=7,  # Further reduced font size for better fit
+                fontName="Arimo",  # Use Arimo for English text
+            )
+            self.arabic_style = ParagraphStyle(
+                name="ArabicStyle",
+                parent=styles["Normal"],
+                fontSize=7,  # Further reduced font size for better fit
+                fontName="NotoSansArabic",  # Use NotoSansArabic for Arabic text
+                alignment=2,  # Right alignment for Arabic text
+            )
+
+            # Read the logo once, each render wraps the bytes in its own buffer
+            logo_path = os.path.join(
+                settings.MEDIA_ROOT, "default_photos", "quickStop-logo.png"
+            )
+            self.logo = None
+            if os.path.exists(logo_path):
+                with open(logo_path, "rb") as logo_file:
+                    self.logo = logo_file.read()
+
+            # Shape the constant Arabic footer lines once
+            self.footer_notes = [
+                format_arabic_text(
+                    "المركز غير مسؤول عن أي معاملة بعد ثلاثة أيام من تاريخ الانجاز"
                 ),
-                Paragraph("Total Typing Fee:", normal_style),
-                f"{float(invoice.total_typing_fee):.2f}",
-            ],
-            [
-                Paragraph(
-                    "Transaction revision is advised as we are responsible for it before delivering to labour authority",
-                    normal_style,
+                format_arabic_text(
+                    "يرجى مراجعة بيانات المعاملة حيث اننا مسؤولون عنها قبل تسليمها للعمل"
                 ),
-                Paragraph("VAT:", normal_style),
-                f"{float(invoice.vat):.2f}",
-            ],
-            [
-                Paragraph("Telephone: +971 4 222 0013", normal_style),
-                Paragraph("Total Additional Fee:", normal_style),
-                f"{float(invoice.total_additional_fee):.2f}",
-            ],
-            [
-                "",  # Empty cell for Arabic text or description
-                Paragraph("Total Fins:", normal_style),  # Total Fins label
-                f"{float(invoice.total_fins):.2f}",  # Total Fins value
-            ],
+            ]
+
+            self.details_table_style = TableStyle(
+                [
+                    ("ALIGN", (0, 0), (-1, -1), "RIGHT"),
+                    ("FONTNAME", (0, 0), (-1, -1), "Arimo"),  # Use Arimo for details
+                    ("FONTSIZE", (0, 0), (-1, -1), 7),  # Reduced font size
+                    ("BOTTOMPADDING", (0, 0), (-1, -1), 5),
+                ]
+            )
+            self.line_items_table_style = TableStyle(
+                [
+                    # Header row styling
+                    ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
+                    ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
+                    ("ALIGN", (0, 0), (-1, 0), "CENTER"),
+                    ("FONTNAME", (0, 0), (-1, 0), "Arimo"),  # Use Arimo for headers
+                    ("FONTSIZE", (0, 0), (-1, 0), 7),  # Reduced font size
+                    ("BOTTOMPADDING", (0, 0), (-1, 0), 12),
+                    # Body row styling
+                    ("BACKGROUND", (0, 1), (-1, -1), colors.beige),
+                    ("GRID", (0, 0), (-1, -1), 1, colors.black),
+                    # Cell padding
+                    ("PADDING", (0, 0), (-1, -1), 5),  # Add padding to all cells
+                    # Align text columns to the left
+                    ("ALIGN", (1, 1), (2, -1), "LEFT"),  # DEPARTMENT and SERVICE NAME
+                    # Align numeric columns to the right
+                    ("ALIGN", (3, 1), (-1, -1), "RIGHT"),  # GOV FEE, QTY, GOV. TOTAL, etc.
+                    # Font size for body
+                    ("FONTSIZE", (0, 1), (-1, -1), 7),  # Reduced font size
+                    # Wrap text for headers and cells
+                    (
+                        "WORDWRAP",
+                        (0, 0),
+                        (-1, -1),
+                        True,
+                    ),  # Enable text wrapping for all cells
+                ]
+            )
+            self.totals_footer_table_style = TableStyle(
+                [
+                    ("ALIGN", (0, 0), (-1, -1), "LEFT"),  # Align footer text to the left
+                    ("ALIGN", (1, 0), (2, -1), "RIGHT"),  # Align totals to the right
+                    ("FONTNAME", (0, 0), (-1, -1), "Arimo"),  # Use Arimo for all text
+                    ("FONTSIZE", (0, 0), (-1, -1), 7),  # Reduced font size
+                    ("BOTTOMPADDING", (0, 0), (-1, -1), 5),
+                ]
+            )
+            self._loaded = True
+
+    def render(self, document):
+        """
+        Write the PDF of an ``invoice_document`` and return its path relative
+        to MEDIA_ROOT.
+        """
+        if not self._loaded:
+            self._load()
+
+        # Define the file path, named after the content it renders
+        file_name = f"{document['id']}-{document['hash'][:16]}.pdf"
+        file_path = os.path.join(
+            settings.MEDIA_ROOT, "uploads", "invoice", "pdf", file_name
+        )
+
+        # Ensure the directory exists
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+        # Create the PDF document with adjusted margins; build it next to the
+        # final file and swap it in, so a download never reads a partial PDF
+        temp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        pdf = SimpleDocTemplate(
+            temp_path, pagesize=A4, leftMargin=10, rightMargin=10
+        )  # Reduced margins
+        try:
+            pdf.build(self.build_elements(document))
+            os.replace(temp_path, file_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        # Return the file path relative to MEDIA_ROOT
+        return os.path.join("uploads", "invoice", "pdf", file_name)
+
+    def build_elements(self, document):
+        normal_style = self.normal_style
+        elements = []
+
+        # Add logo
+        if self.logo is not None:
+            logo = Image(
+                BytesIO(self.logo), width=100, height=50
+            )  # Adjust width and height as needed
+            logo.hAlign = "LEFT"
+            elements.append(logo)
+            elements.append(Spacer(1, 12))
+
+        # Add title
+        elements.append(Paragraph("TAX INVOICE", self.title_style))
+        elements.append(Spacer(1, 12))
+
+        # Generate barcode
+        barcode_class = barcode.get_barcode_class("code128")
+        barcode_instance = barcode_class(document["id"], writer=ImageWriter())
+        barcode_buffer = BytesIO()
+        barcode_instance.write(barcode_buffer)
+        barcode_image = Image(barcode_buffer, width=200, height=50)
+        elements.append(barcode_image)
+        elements.append(Spacer(1, 12))
+
+        # Add invoice details in the top right
+        details = document["details"]
+        details_table = Table(details, colWidths=[80, 180])  # Adjusted column widths
+        details_table.setStyle(self.details_table_style)
+        elements.append(details_table)
+        elements.append(Spacer(1, 12))
+
+        # Add line items
+        line_items = [
             [
-                Paragraph("Al Maktoum Hospital Rd - Al Wasl Deira", normal_style),
-                Paragraph("Grand Total Fee:", normal_style),
-                f"{float(invoice.grand_total):.2f}",
-            ],
+                "NO",
+                "DEPARTMENT",
+                "SERVICE NAME",
+                "GOV FEE",
+                "QTY",
+                "GOV. TOTAL",
+                "SERVICE",
+                "TYPING",
+                "ADDFEE",
+                "VAT",
+                "FINS",  # New column for fins
+                "TOTAL",
+                "REFNO 1",
+                "REFNO 2",
+                "REFNO 3",
+            ]
+        ]
+
+        line_items.extend(document["line_items"])
+
+        # Define column widths for the line items table
+        col_widths = [
+            15,
+            60,
+            90,
+            35,
+            20,
+            40,
+            35,
+            35,
+            35,
+            35,
+            35,
+            35,
+            35,
+            35,
+            35,
+        ]  # Adjusted widths
+
+        # Create the line items table
+        line_items_table = Table(line_items, colWidths=col_widths)
+        line_items_table.setStyle(self.line_items_table_style)
+        elements.append(line_items_table)
+        elements.append(Spacer(1, 12))
+
+        # Add totals and footer in a two-column layout
+        totals_footer_table = Table(
             [
-                Paragraph("Dubai, UAE, P.O. Box: 40974", normal_style),
-                "",  # Empty cell for alignment
-                "",  # Empty cell for alignment
+                [
+                    Paragraph(self.footer_notes[0], self.arabic_style),
+                    Paragraph("Total Govt Fee:", normal_style),
+                    document["totals"]["total_gov_fee"],
+                ],
+                [
+                    Paragraph(self.footer_notes[1], self.arabic_style),
+                    Paragraph("Total Service Fee:", normal_style),
+                    document["totals"]["total_service_fee"],
+                ],
+                [
+                    Paragraph(
+                        "The Center is not responsible for any transaction after 3 Days from completion",
+                        normal_style,
+                    ),
+                    Paragraph("Total Typing Fee:", normal_style),
+                    document["totals"]["total_typing_fee"],
+                ],
+                [
+                    Paragraph(
+                        "Transaction revision is advised as we are responsible for it before delivering to labour authority",
+                        normal_style,
+                    ),
+                    Paragraph("VAT:", normal_style),
+                    document["totals"]["vat"],
+                ],
+                [
+                    Paragraph("Telephone: +971 4 222 0013", normal_style),
+                    Paragraph("Total Additional Fee:", normal_style),
+                    document["totals"]["total_additional_fee"],
+                ],
+                [
+                    "",  # Empty cell for Arabic text or description
+                    Paragraph("Total Fins:", normal_style),  # Total Fins label
+                    document["totals"]["total_fins"],  # Total Fins value
+                ],
+                [
+                    Paragraph("Al Maktoum Hospital Rd - Al Wasl Deira", normal_style),
+                    Paragraph("Grand Total Fee:", normal_style),
+                    document["totals"]["grand_total"],
+                ],
+                [
+                    Paragraph("Dubai, UAE, P.O. Box: 40974", normal_style),
+                    "",  # Empty cell for alignment
+                    "",  # Empty cell for alignment
+                ],
             ],
-        ],
-        colWidths=[250, 100, 100],  # Adjust column widths as needed
-    )
-    totals_footer_table.setStyle(
-        TableStyle(
-            [
-                ("ALIGN", (0, 0), (-1, -1), "LEFT"),  # Align footer text to the left
-                ("ALIGN", (1, 0), (2, -1), "RIGHT"),  # Align totals to the right
-                ("FONTNAME", (0, 0), (-1, -1), "Arimo"),  # Use Arimo for all text
-                ("FONTSIZE", (0, 0), (-1, -1), 7),  # Reduced font size
-                ("BOTTOMPADDING", (0, 0), (-1, -1), 5),
-            ]
+            colWidths=[250, 100, 100],  # Adjust column widths as needed
         )
-    )
-    elements.append(totals_footer_table)
+        totals_footer_table.setStyle(self.totals_footer_table_style)
+        elements.append(totals_footer_table)
 
-    # Build the PDF
-    pdf.build(elements)
+        return elements
 
-    # Return the file path relative to MEDIA_ROOT
-    return os.path.join("uploads", "invoice", "pdf", file_name)
+
+invoice_pdf_renderer = InvoicePDFRenderer()
+
+
+def render_invoice_document(document):
+    return invoice_pdf_renderer.render(document)
+
+
+def generate_invoice_pdf(invoice):
+    return render_invoice_document(invoice_document(invoice))
 
 
 ############################################################################################
@@ -358,6 +462,122 @@ def invoice_pdf_file_path(instance, filename):
     return os.path.join("uploads", "invoice", "pdf", filename)
 
 
+class _Echo:
+    """Pseudo file for ``csv.writer`` that hands back each formatted line."""
+
+    def write(self, value):
+        return value
+
+
+if django.VERSION >= (4, 2):
+    # Streams async iterators itself
+    AsyncStreamingHttpResponse = StreamingHttpResponse
+else:
+
+    class AsyncStreamingHttpResponse(StreamingHttpResponse):
+        """
+        ``StreamingHttpResponse`` over an async iterator, so whatever it reads
+        from the database goes through ``sync_to_async`` instead of blocking
+        the event loop, as Django 4.2 supports natively. Under ASGI it is sent
+        part by part (see ``qms_api.asgi``); synchronous consumers such as the
+        test client get the whole content at once.
+        """
+
+        @property
+        def streaming_content(self):
+            if not self.is_async:
+                return super().streaming_content
+
+            async def collect():
+                return [part async for part in self]
+
+            return iter(async_to_sync(collect)())
+
+        @streaming_content.setter
+        def streaming_content(self, value):
+            self._set_streaming_content(value)
+
+        def _set_streaming_content(self, value):
+            self.is_async = hasattr(value, "__aiter__")
+            if self.is_async:
+                self._iterator = aiter(value)
+            else:
+                super()._set_streaming_content(value)
+
+        async def __aiter__(self):
+            async for part in self._iterator:
+                yield self.make_bytes(part)
+
+
+async def aiterate_chunks(queryset, chunk_size=2000):
+    """
+    Iterate ``queryset`` from async code as lists of up to ``chunk_size``
+    rows, read through a server-side cursor in a worker thread.
+    """
+    rows = None
+
+    def next_chunk():
+        nonlocal rows
+        if rows is None:
+            rows = queryset.iterator(chunk_size=chunk_size)
+        return list(islice(rows, chunk_size))
+
+    while True:
+        chunk = await sync_to_async(next_chunk)()
+        if chunk:
+            yield chunk
+        if len(chunk) < chunk_size:
+            break
+
+
+async def aiterate(queryset, chunk_size=2000):
+    """Iterate the rows of ``queryset`` from async code, see ``aiterate_chunks``."""
+    async for chunk in aiterate_chunks(queryset, chunk_size):
+        for row in chunk:
+            yield row
+
+
+async def stream_csv(headers, rows=None, lines_per_chunk=500):
+    """
+    Yield the CSV text of ``headers`` and the async iterable ``rows`` in
+    chunks of ``lines_per_chunk`` lines, so only one chunk is held in memory
+    at a time.
+    """
+    writer = csv.writer(_Echo())
+    lines = [writer.writerow(headers)]
+    if rows is not None:
+        async for row in rows:
+            lines.append(writer.writerow(row))
+            if len(lines) >= lines_per_chunk:
+                yield "".join(lines)
+                lines = []
+    if lines:
+        yield "".join(lines)
+
+
+def csv_export_response(filename, headers, queryset=None, fields=(), chunk_size=2000):
+    """
+    Stream ``fields`` of every row of ``queryset`` as a CSV attachment, or
+    only the header line when no queryset is given.
+
+    The rows are read with ``values_list`` through a server-side cursor,
+    ``chunk_size`` at a time and off the event loop, so memory use stays
+    flat however many rows are exported.
+    """
+    # Translate the headers now, while the request language is active
+    headers = [str(header) for header in headers]
+    rows = (
+        aiterate(queryset.values_list(*fields), chunk_size=chunk_size)
+        if queryset is not None
+        else None
+    )
+    response = AsyncStreamingHttpResponse(
+        stream_csv(headers, rows), content_type="text/csv"
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
 def random_string_generator(size=10, chars=string.ascii_lowercase + string.digits):
     return "".join(random.choice(chars) for _ in range(size))
 
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.test import APIRequestFactory
+
+from user.views import LoginView
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure login throughput (logins per second on one core) with the "
+        "credentials of an existing user, to catch regressions of LoginView."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("identifier", help="Email or mobile number.")
+        parser.add_argument("password")
+        parser.add_argument("--logins", type=int, default=50)
+
+    def handle(self, *args, **options):
+        view = LoginView.as_view()
+        factory = APIRequestFactory()
+        data = {"identifier": options["identifier"], "password": options["password"]}
+
+        def login():
+            response = view(factory.post("/api/users/login/", data, format="json"))
+            if response.status_code != 200:
+                raise CommandError(f"Login failed: {response.data}")
+
+        # The first login fills the caches
+        login()
+
+        started = time.perf_counter()
+        cpu_started = time.process_time()
+        for _ in range(options["logins"]):
+            login()
+        elapsed = time.perf_counter() - started
+        cpu = time.process_time() - cpu_started
+
+        self.stdout.write(
+            f"{options['logins']} logins in {elapsed:.2f}s: "
+            f"{options['logins'] / elapsed:.1f} logins/s, "
+            f"{elapsed / options['logins'] * 1000:.1f} ms each "
+            f"({cpu / elapsed:.0%} of it on this core)"
+        )
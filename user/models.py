@@ -182,6 +182,15 @@ class User(AbstractBaseUser, PermissionsMixin):
             if not self.avatar:
                 self.resize_and_save_avatar()
 
+    def refresh_from_db(self, using=None, fields=None):
+        # Users resolved by CachedJWTAuthentication carry only a few fields;
+        # load all the deferred ones on first use rather than one at a time
+        if fields is not None:
+            deferred_fields = self.get_deferred_fields()
+            if deferred_fields.intersection(fields):
+                fields = deferred_fields.union(fields)
+        super().refresh_from_db(using=using, fields=fields)
+
     def resize_photo(self):
         # Set the maximum size in bytes (1 MB = 1024 * 1024 bytes)
         max_size_bytes = 1024 * 1024
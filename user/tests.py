@@ -0,0 +1,68 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from qms_api.authentication import CachedJWTAuthentication
+from user.models import User
+
+
+# Tests never touch the shared Redis cache the settings point at
+LOCAL_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+}
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class CachedJWTAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email="employee@example.com",
+            mobile_number="0501234567",
+            password="password",
+            name="Employee",
+            name_ar="موظف",
+            identification="784000000000001",
+            position="Cashier",
+        )
+
+    def setUp(self):
+        self.addCleanup(cache.delete, f"auth_principal:{self.user.id}")
+
+    def authenticate(self, token):
+        request = APIRequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        return CachedJWTAuthentication().authenticate(request)[0]
+
+    def test_cached_principal_has_no_password_hash(self):
+        token = AccessToken.for_user(self.user)
+        self.authenticate(token)
+
+        entry = cache.get(f"auth_principal:{self.user.id}")
+        self.assertNotIn(self.user.password, repr(entry))
+
+        with self.assertNumQueries(0):
+            user = self.authenticate(token)
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertTrue(user.is_active)
+        # The other fields load together on first use
+        with self.assertNumQueries(1):
+            self.assertEqual(user.name, "Employee")
+            self.assertEqual(user.position, "Cashier")
+            self.assertTrue(user.check_password("password"))
+
+    def test_password_change_revokes_tokens(self):
+        with mock.patch.object(api_settings, "CHECK_REVOKE_TOKEN", True):
+            token = AccessToken.for_user(self.user)
+            self.assertEqual(self.authenticate(token).pk, self.user.pk)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.user.set_password("new password")
+                self.user.save()
+
+            with self.assertRaises(AuthenticationFailed):
+                self.authenticate(token)
@@ -1,4 +1,4 @@
-from django.http import Http404, HttpResponse  # added by me
+from django.http import Http404  # added by me
 from django.utils.translation import gettext_lazy as _
 from django.db.models import Q
 from django.shortcuts import get_object_or_404
@@ -23,11 +23,10 @@ from rest_framework.decorators import action
 from rest_framework.filters import SearchFilter, OrderingFilter
 from rest_framework.parsers import JSONParser
 
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from qms_api.authentication import CachedJWTAuthentication, user_principals
 from rest_framework_simplejwt.tokens import RefreshToken
 
 import uuid
-import csv
 import logging
 import json
 import string
@@ -50,22 +49,35 @@ from apps.counter.models import Counter  # Import the Counter model
 from user.filters import UserFilter
 
 from qms_api.pagination import StandardResultsSetPagination
+from qms_api.util import csv_export_response
 from qms_api.custom_permissions import HasPermissionOrInGroupWithPermission
 
 
 # User login view
 class LoginView(APIView):
     # Primary login view
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
 
     def post(self, request):
         identifier = request.data.get("identifier")  # Field for email or phone number
         password = request.data.get("password")
 
-        # Filter using Q objects to match either email or phone_number
-        user = User.objects.filter(
-            Q(email=identifier) | Q(mobile_number=identifier)
-        ).first()
+        # Filter using Q objects to match either email or phone_number, loading
+        # only what the checks and the response need
+        user = (
+            User.objects.filter(Q(email=identifier) | Q(mobile_number=identifier))
+            .only(
+                "id",
+                "email",
+                "mobile_number",
+                "password",
+                "name",
+                "is_staff",
+                "is_active",
+                "is_deleted",
+            )
+            .first()
+        )
 
         if user is None:
             raise AuthenticationFailed(
@@ -86,30 +98,19 @@ class LoginView(APIView):
 
         refresh = RefreshToken.for_user(user)
         response = Response()
-        # Extract group names and convert them to a list of strings
-        group_names = list(user.groups.values_list("name", flat=True))
-        user_permissions_names = list(
-            user.user_permissions.values_list("codename", flat=True)
-        )
-        # Retrieve all counters where the user is assigned as an employee
-        counters = Counter.objects.filter(
-            employee=user, is_active=True, is_deleted=False
-        )
-
-        # Collect the counter IDs and numbers
-        counter_info = [
-            {"id": str(counter.id), "number": counter.number} for counter in counters
-        ]
+        # Group names, permission codenames and the user's active counters
+        # (IDs and numbers), cached per user
+        profile = user_principals.login_profile(user)
 
         response.data = {
             "identifier": (
                 user.email if user.email == identifier else user.mobile_number
             ),
-            "groups": group_names,
-            "user_permissions": user_permissions_names,
+            "groups": profile["groups"],
+            "user_permissions": profile["user_permissions"],
             "name": user.name,
             "is_staff": user.is_staff,
-            "counters": counter_info,  # Include counter IDs and numbers
+            "counters": profile["counters"],  # Include counter IDs and numbers
             "access_token": str(refresh.access_token),
             # "refresh_token": str(refresh),
         }
@@ -118,7 +119,7 @@ class LoginView(APIView):
 
 class CreateUserView(generics.CreateAPIView):
     serializer_class = UserSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "user.add_user"
 
@@ -141,7 +142,7 @@ class CreateUserView(generics.CreateAPIView):
 class UserListView(generics.ListAPIView):
     queryset = User.objects.filter(is_deleted=False, is_superuser=False)
     serializer_class = UserSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "user.view_user"
     pagination_class = StandardResultsSetPagination
@@ -161,7 +162,7 @@ class UserListView(generics.ListAPIView):
 class DeletedUserView(generics.ListAPIView):
     queryset = User.objects.filter(is_deleted=True)
     serializer_class = UserSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "user.view_user"
 
@@ -174,7 +175,7 @@ class DeletedUserView(generics.ListAPIView):
 
 class UserRetrieveView(generics.RetrieveAPIView):
     serializer_class = UserSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "user.view_user"
 
@@ -191,7 +192,7 @@ class UserRetrieveView(generics.RetrieveAPIView):
 
 class UploadUserPhotoView(generics.UpdateAPIView):
     serializer_class = UserImageSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "user.change_user"
 
@@ -228,7 +229,7 @@ class UploadUserPhotoView(generics.UpdateAPIView):
 
 class UploadUserCoverView(generics.UpdateAPIView):
     serializer_class = UserCoverSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "user.change_user"
 
@@ -264,7 +265,7 @@ class UploadUserCoverView(generics.UpdateAPIView):
 
 class ManagerUserView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get_object(self):
@@ -291,7 +292,7 @@ class ManagerUserView(generics.RetrieveUpdateAPIView):
 
 class UserDeleteTemporaryView(generics.UpdateAPIView):
     serializer_class = UserDeleteSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "user.change_user"
 
@@ -330,7 +331,7 @@ class UserDeleteTemporaryView(generics.UpdateAPIView):
 class UserRestoreView(generics.RetrieveUpdateAPIView):
 
     serializer_class = UserDeleteSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "user.change_user"
 
@@ -364,7 +365,7 @@ class UserRestoreView(generics.RetrieveUpdateAPIView):
 
 class UserUpdateView(generics.UpdateAPIView):
     serializer_class = UserSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "user.change_user"
 
@@ -388,7 +389,7 @@ class UserUpdateView(generics.UpdateAPIView):
 
 
 class UserDeleteView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "user.delete_user"
 
@@ -428,13 +429,13 @@ class UserDeleteView(APIView):
 class UserDialogView(generics.ListAPIView):
     serializer_class = UserDialogSerializer
     queryset = User.objects.filter(is_deleted=False, is_superuser=False)
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "user.view_user"
 
 
 class UserGenderDialogView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "user.view_user"
 
@@ -455,7 +456,7 @@ class UsersWithoutCounterView(generics.ListAPIView):
     """
 
     serializer_class = UserDialogSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "user.view_user"
 
@@ -542,15 +543,13 @@ def forgot_password(request):
 
 # Exporting user model
 class ExportUsersToCSV(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, HasPermissionOrInGroupWithPermission]
     permission_codename = "user.view_user"
 
     def get(self, request):
         empty_export = request.query_params.get("empty", "").lower() == "true"
 
-        response = HttpResponse(content_type="text/csv")
-
         # Define headers list regardless of the export type
         headers = [
             _("Email"),
@@ -571,34 +570,26 @@ class ExportUsersToCSV(APIView):
 
         # Check if empty_export is True, if so, only export headers
         if empty_export:
-            response["Content-Disposition"] = (
-                'attachment; filename="employee_headers.csv"'
-            )
-            writer = csv.writer(response)
-            writer.writerow(headers)
-            return response
-        else:
-            response["Content-Disposition"] = 'attachment; filename="employees.csv"'
-            users = User.objects.filter(is_superuser=False)
-            writer = csv.writer(response)
-            writer.writerow(headers)
-            for user in users:
-                writer.writerow(
-                    [
-                        user.email,
-                        user.name,
-                        user.name_ar,
-                        user.created_at,
-                        user.updated_at,
-                        user.nationality,
-                        user.passport,
-                        user.identification,
-                        user.birthdate,
-                        user.position,
-                        user.gender,
-                        user.education,
-                        user.home_address,
-                        user.mobile_number,
-                    ]
-                )
-            return response
+            return csv_export_response("employee_headers.csv", headers)
+
+        return csv_export_response(
+            "employees.csv",
+            headers,
+            User.objects.filter(is_superuser=False).order_by("created_at"),
+            [
+                "email",
+                "name",
+                "name_ar",
+                "created_at",
+                "updated_at",
+                "nationality",
+                "passport",
+                "identification",
+                "birthdate",
+                "position",
+                "gender",
+                "education",
+                "home_address",
+                "mobile_number",
+            ],
+        )